@@ -17,9 +17,12 @@ import sys, os, socket, subprocess, signal, threading, platform
 import time, struct, traceback, locale, codecs, getopt, wave, tempfile
 import optparse
 from glob import glob
-from BeautifulSoup import BeautifulSoup
-from xml.dom.minidom import Document
 from openhrivoice.parsesrgs import *
+from openhrivoice.parsejuliusmodule import *
+from openhrivoice.juliuswrap import JuliusWrap as JuliusWrapBase
+from openhrivoice import resultformat
+from openhrivoice.grammarcache import GrammarCache
+from openhrivoice.lexicondb import Pronouncer
 import OpenRTM_aist
 import RTC
 from openhrivoice.__init__ import __version__
@@ -33,175 +36,38 @@ except:
 
 __doc__ = _('Julius (English and Japanese) speech recognition component.')
 
-class JuliusWrap(threading.Thread):
-    CB_DOCUMENT = 1
-    CB_LOGWAVE = 2
-    
-    def __init__(self, language='jp'):
-        threading.Thread.__init__(self)
-        self._config = config()
-        self._running = False
-        self._platform = platform.system()
-        self._gotinput = False
-        self._lang = language
-        self._memsize = "large"
-        #self._memsize = "medium"
-        self._logdir = tempfile.mkdtemp()
-        self._callbacks = []
-        self._grammars = {}
-        self._firstgrammar = True
-        self._activegrammars = {}
-        self._prevdata = ''
-        self._modulesocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._audiosocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._cmdline = []
-        self._cmdline.append(self._config._julius_bin)
+class JuliusWrap(JuliusWrapBase):
+    def commandline(self):
+        if self._options.get('profile') != 'dictation':
+            # running SRGS grammars: start without the N-gram
+            return JuliusWrapBase.commandline(self)
+        cmdline = []
+        cmdline.append(self._config._julius_bin)
         if self._lang in ('ja', 'jp'):
-            self._cmdline.extend(['-h',  self._config._julius_hmm_ja])
-            self._cmdline.extend(['-hlist', self._config._julius_hlist_ja])
-            self._cmdline.extend(['-d',  self._config._julius_ngram_ja])
-            self._cmdline.extend(['-v', self._config._julius_dict_ja])
-            #self._cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy.dfa")])
-            #self._cmdline.extend(["-v" , os.path.join(self._config._basedir, "dummy.dict")])
-            self._cmdline.extend(["-sb", "80.0"])
+            cmdline.extend(['-h',  self._config._julius_hmm_ja])
+            cmdline.extend(['-hlist', self._config._julius_hlist_ja])
+            cmdline.extend(['-d',  self._config._julius_ngram_ja])
+            cmdline.extend(['-v', self._config._julius_dict_ja])
+            if self._options.has_key('userdict'):
+                cmdline.extend(['-adddict', self._options['userdict']])
+            #cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy.dfa")])
+            #cmdline.extend(["-v" , os.path.join(self._config._basedir, "dummy.dict")])
+            cmdline.extend(["-sb", "80.0"])
         else:
             print "language error!!"
             sys.exit(1)
-        self._audioport = self.getunusedport()
-        self._moduleport = self.getunusedport()
-        self._cmdline.extend(["-input", "adinnet",  "-adport",  str(self._audioport)])# adinnet クライアントからの入力
-        self._cmdline.extend(["-module", str(self._moduleport)])# サーバーモジュールモードで起動
-        if self._memsize == "large":
-            #self._cmdline.extend(["-b", "-1", "-b2", "120", "-s", "1000" ,"-m", "2000"])
-            self._cmdline.extend(["-b", "750", "-b2", "120", "-s", "1000" ,"-m", "2000"])
-        else:
-            #self._cmdline.extend(["-b", "-1", "-b2", "80", "-s", "500" ,"-m", "1000"])
-            self._cmdline.extend(["-b", "750", "-b2", "80", "-s", "500" ,"-m", "1000"])
-        self._cmdline.extend(["-n", "5", "-output", "5"])
-        self._cmdline.extend(["-pausesegment", "-rejectshort", "200"])# レベル・零交差による音声区間検出の強制ON  # 200ミリ秒以下の長さの入力を棄却する
-        self._cmdline.extend(["-nostrip"])# ゼロ続きの無効な入力部の除去をOFFにする
-        #self._cmdline.extend(["-multipath"])
-        #self._cmdline.extend(["-spmodel", "sp", "-iwsp", "-iwsppenalty", "-70.0"])
-        #self._cmdline.extend(["-penalty1", "5.0", "-penalty2", "20.0", "-iwcd1", "max", "-gprune", "safe"])
-        self._cmdline.extend(["-record", self._logdir])
-        self._cmdline.extend(["-smpFreq", "16000"])
-        self._cmdline.extend(["-forcedict"])## エラー単語を無視して続行する
-        #self._cmdline.extend(["-nolog"])
-        print "command line: %s" % " ".join(self._cmdline)
-        self._running = True
-        self._p = subprocess.Popen(self._cmdline)
-        print "connecting to ports"
-        for retry in range(0, 10):
-            try:
-                self._modulesocket.connect(("localhost", self._moduleport))
-            except socket.error:
-                time.sleep(1)
-                continue
-            break
-        for retry in range(0, 10):
-            try:
-                self._audiosocket.connect(("localhost", self._audioport))
-            except socket.error:
-                time.sleep(1)
-                continue
-            break
-        self._modulesocket.sendall("INPUTONCHANGE TERMINATE\n")
-        print "JuliusWrap started"
-
-    def getunusedport(self):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.bind(('localhost', 0))
-        addr, port = s.getsockname()
-        s.close()
-        return port
-
-    def terminate(self):
-        print 'JuliusWrap: terminate'
-        self._running = False
-        self._audiosocket.close()
-        self._modulesocket.close()
-        self._p.terminate()
-        return 0
-
-    def write(self, data):
-        try:
-            self._audiosocket.send(struct.pack("i", len(data)))
-            self._audiosocket.sendall(data)
-        except socket.error:
-            try:
-                self._audiosocket.connect(("localhost", self._audioport))
-            except:
-                pass
-        return 0
-
-    def run(self):
-        while self._running:
-            for f in glob(os.path.join(self._logdir, "*.wav")):
-                for c in self._callbacks:
-                    c(self.CB_LOGWAVE, f)
-            try:
-                self._modulesocket.settimeout(1)
-                data = self._prevdata + unicode(self._modulesocket.recv(1024*10), 'euc_jp')
-                #print "----The recved data----\n%s\n" % (data,)
-            except socket.timeout:
-                continue
-            except socket.error:
-                print 'socket error'
-                break
-            self._gotinput = True
-            ds = data.split(".\n")
-            self._prevdata = ds[-1]
-            ds = ds[0:-1]
-            for d in ds:
-                dx = BeautifulSoup(d)
-                for c in self._callbacks:
-                    c(self.CB_DOCUMENT, dx)
-        print 'JuliusWrap: exit from event loop'
-
-    def addgrammar(self, data, name):
-        if self._firstgrammar == True:
-            self._modulesocket.sendall("CHANGEGRAM %s\n" % (name,))
-            self._firstgrammar = False
-        else:
-            self._modulesocket.sendall("ADDGRAM %s\n" % (name,))
-        self._modulesocket.sendall(data.encode('euc_jp', 'backslashreplace'))
-        self._grammars[name] = len(self._grammars)
-        self._activegrammars[name] = True
-        time.sleep(0.1)
-
-    def activategrammar(self, name):
-        try:
-            gid = self._grammars[name]
-        except KeyError:
-            print "[error] unknown grammar: %s" % (name,)
-            return
-        print "ACTIVATEGRAM %s" % (name,)
-        self._modulesocket.sendall("ACTIVATEGRAM\n%s\n" % (name,))
-        self._activegrammars[name] = True
-        time.sleep(0.1)
-
-    def deactivategrammar(self, name):
-        try:
-            gid = self._grammars[name]
-        except KeyError:
-            print "[error] unknown grammar: %s" % (name,)
-            return
-        print "DEACTIVATEGRAM %s" % (name,)
-        self._modulesocket.sendall("DEACTIVATEGRAM\n%s\n" % (name,))
-        del self._activegrammars[name]
-        time.sleep(0.1)
-
-    def syncgrammar(self):
-        self._modulesocket.sendall("SYNCGRAM\n")
-
-    def switchgrammar(self, name):
-        self.activategrammar(name)
-        for g in self._activegrammars.keys():
-            if g != name:
-                self.deactivategrammar(g)
-
-    def setcallback(self, func):
-        self._callbacks.append(func)
+        cmdline.extend(self.inputoptions())# adinnet クライアント(またはパイプ)からの入力
+        cmdline.extend(["-module", str(self._moduleport)])# サーバーモジュールモードで起動
+        cmdline.extend(self.recognizeroptions())
+        cmdline.extend(["-pausesegment", "-rejectshort", "200"])# レベル・零交差による音声区間検出の強制ON  # 200ミリ秒以下の長さの入力を棄却する
+        cmdline.extend(["-nostrip"])# ゼロ続きの無効な入力部の除去をOFFにする
+        #cmdline.extend(["-multipath"])
+        #cmdline.extend(["-spmodel", "sp", "-iwsp", "-iwsppenalty", "-70.0"])
+        #cmdline.extend(["-penalty1", "5.0", "-penalty2", "20.0", "-iwcd1", "max", "-gprune", "safe"])
+        cmdline.extend(["-smpFreq", "16000"])
+        cmdline.extend(["-forcedict"])## エラー単語を無視して続行する
+        #cmdline.extend(["-nolog"])
+        return cmdline
 
 JuliusDicRTC_spec = ["implementation_id", "JuliusDicRTC",
                   "type_name",         "JuliusDicRTC",
@@ -225,6 +91,22 @@ JuliusDicRTC_spec = ["implementation_id", "JuliusDicRTC",
                   "conf.__descirption__.voiceactivitydetection", _("Specify voice activity detection trigger (fixed to internal).").encode('UTF-8'),
                   "conf.__widget__.voiceactivitydetection", "radio",
                   "conf.__constraints__.voiceactivitydetection", "(internal)",
+                  "conf.default.profile", "dictation",
+                  "conf.__descirption__.profile", _("Engine profile (grammar: acoustic model and SRGS grammars only, without the N-gram). Set to grammar when grammars are given on startup (fixed on startup).").encode('UTF-8'),
+                  "conf.__widget__.profile", "radio",
+                  "conf.__constraints__.profile", "(dictation, grammar)",
+                  "conf.default.vocabularyslot", "",
+                  "conf.__descirption__.vocabularyslot", _("Word of the grammar whose place the added words take (grammar profile).").encode('UTF-8'),
+                  "conf.default.beam", "800",
+                  "conf.__descirption__.beam", _("Beam width of the first pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.beam2", "120",
+                  "conf.__descirption__.beam2", _("Beam width of the second pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.stacksize", "1000",
+                  "conf.__descirption__.stacksize", _("Stack size of the second pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.overflow", "2000",
+                  "conf.__descirption__.overflow", _("Maximum number of hypotheses expanded in the second pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.nbest", "5",
+                  "conf.__descirption__.nbest", _("Number of sentence candidates (applied on the next activation).").encode('UTF-8'),
                   ""]
 
 class DataListener(OpenRTM_aist.ConnectorDataListenerT):
@@ -245,6 +127,15 @@ class JuliusDicRTC(OpenRTM_aist.DataFlowComponentBase):
         self._lang = 'jp'
         self._srgs = None
         self._j = None
+        self._engineopts = None
+        self._active = False
+        self._vocabulary = {} # word: [phones, ...] added at runtime
+        self._pending = [] # (word, pronunciation or None to remove)
+        self._vocablock = threading.Lock()
+        self._pronouncer = None
+        self._userdict = None
+        self._swapping = False
+        self._swapagain = False
         self._copyrights = ['''
 Large Vocabulary Continuous Speech Recognition Engine Julius
 (http://julius.sourceforge.jp/)
@@ -279,6 +170,13 @@ Copyright (c) 2005-2009 Free Software Foundation
         self._grammarport.addConnectorDataListener(OpenRTM_aist.ConnectorDataListenerType.ON_BUFFER_WRITE,
                                                    DataListener("activegrammar", self, RTC.TimedString))
         self.registerInPort(self._grammarport._name, self._grammarport)
+        # create inport for vocabulary
+        self._vocabdata = RTC.TimedString(RTC.Time(0,0), "")
+        self._vocabport = OpenRTM_aist.InPort("vocabulary", self._vocabdata)
+        self._vocabport.appendProperty('description', _('Words to be added (one per line, optionally followed by a tab and the pronunciation) or removed (prefixed by "-"). Applied at once with the grammar profile. With the dictation profile each change restarts julius in the background with the new dictionary.').encode('UTF-8'))
+        self._vocabport.addConnectorDataListener(OpenRTM_aist.ConnectorDataListenerType.ON_BUFFER_WRITE,
+                                                 DataListener("vocabulary", self, RTC.TimedString))
+        self.registerInPort(self._vocabport._name, self._vocabport)
         # create outport for status
         self._statusdata = RTC.TimedString(RTC.Time(0,0), "")
         self._statusport = OpenRTM_aist.OutPort("status", self._statusdata)
@@ -303,112 +201,309 @@ Copyright (c) 2005-2009 Free Software Foundation
                 self._logger.RTC_INFO('  '+l)
             self._logger.RTC_INFO('')
 
+        self._profile = ["dictation",]
+        self.bindParameter("profile", self._profile, "dictation")
+        self._vocabularyslot = ["",]
+        self.bindParameter("vocabularyslot", self._vocabularyslot, "")
+        self._beam = [800,]
+        self.bindParameter("beam", self._beam, "800")
+        self._beam2 = [120,]
+        self.bindParameter("beam2", self._beam2, "120")
+        self._stacksize = [1000,]
+        self.bindParameter("stacksize", self._stacksize, "1000")
+        self._overflow = [2000,]
+        self.bindParameter("overflow", self._overflow, "2000")
+        self._nbest = [5,]
+        self.bindParameter("nbest", self._nbest, "5")
+        # prestart the engine so that activation does not wait for julius
+        # (with the grammar profile it is started when the grammar is set,
+        # the bound parameters are not updated yet)
+        if utils.initialparameter(self._properties, "profile", "dictation") == 'dictation':
+            for (name, var) in (("beam", self._beam), ("beam2", self._beam2), ("stacksize", self._stacksize),
+                                ("overflow", self._overflow), ("nbest", self._nbest)):
+                var[0] = int(utils.initialparameter(self._properties, name, var[0]))
+            self.startengine()
         return RTC.RTC_OK
 
+    def engineoptions(self):
+        # search options of julius taken from the configuration parameters
+        return {'beam': self._beam[0], 'beam2': self._beam2[0], 'stack': self._stacksize[0],
+                'overflow': self._overflow[0], 'nbest': self._nbest[0]}
+
+    def startengine(self):
+        self._j = self.createengine()
+        return self._j is not None
+
+    def createengine(self):
+        # dictation with the N-gram unless SRGS grammars are given
+        profile = 'dictation'
+        if self._srgs is not None:
+            profile = 'grammar'
+            self._lang = self._srgs._lang
+        options = {'profile': profile}
+        self._engineopts = self.engineoptions()
+        options.update(self._engineopts)
+        self._vocablock.acquire()
+        try:
+            words = self._vocabulary.items()
+        finally:
+            self._vocablock.release()
+        if profile == 'dictation' and len(words) > 0:
+            options['userdict'] = self.writeuserdict(words)
+        j = JuliusWrap(self._lang, None, options)
+        j.setcallback(self.onResult)
+        j.start()
+        if j.waitready() == False:
+            self._logger.RTC_ERROR("julius is not responding")
+            j.terminate()
+            j.join()
+            return None
+        if self._srgs is not None:
+            grams = GrammarCache().compileall(self._srgs)
+            for (r, gram) in grams:
+                if gram == "":
+                    j.terminate()
+                    j.join()
+                    return None
+                self._logger.RTC_INFO("register grammar: %s" % (r,))
+            j.addgrammars(grams)
+            j.switchgrammar(self._srgs._rootrule)
+            if len(words) > 0:
+                j.addwords(words, self._vocabularyslot[0])
+        # keep the engine idle until the component is activated
+        j.pause()
+        return j
+
+    def stopengine(self):
+        if self._j:
+            self._j.terminate()
+            self._j.join()
+            self._j = None
+
+    def writeuserdict(self, words):
+        # the runtime words are given to julius as an additional dictionary
+        if self._userdict is None:
+            (fd, self._userdict) = tempfile.mkstemp('.dict', 'juliusdic')
+            os.close(fd)
+        f = open(self._userdict, 'w')
+        try:
+            for (w, phones) in words:
+                for p in phones:
+                    f.write((u"%s\t[%s]\t%s\n" % (w, w, p)).encode('euc_jp', 'backslashreplace'))
+        finally:
+            f.close()
+        return self._userdict
+
+    def addwords(self, words):
+        """ Queue words (text or (text, pronunciation)) to be added.
+
+        The queued changes are applied together in the next execution cycle.
+        Pronunciations (kana, ARPAbet or IPA) are looked up in the
+        pronunciation database unless given.
+        """
+        self._vocablock.acquire()
+        try:
+            for w in words:
+                if isinstance(w, tuple):
+                    self._pending.append(w)
+                else:
+                    self._pending.append((w, ''))
+        finally:
+            self._vocablock.release()
+
+    def removewords(self, words):
+        """ Queue words to be removed."""
+        self._vocablock.acquire()
+        try:
+            self._pending.extend([(w, None) for w in words])
+        finally:
+            self._vocablock.release()
+
+    def applyvocabulary(self):
+        # apply the queued changes of the vocabulary in one batch
+        self._vocablock.acquire()
+        try:
+            pending = self._pending
+            self._pending = []
+        finally:
+            self._vocablock.release()
+        if len(pending) == 0:
+            return
+        if self._pronouncer is None or self._pronouncer._lang != self._lang:
+            self._pronouncer = Pronouncer(self._lang)
+        vocabulary = dict(self._vocabulary)
+        added = {} # word: pronunciations not registered yet
+        removed = set()
+        for (word, pronounce) in pending:
+            if pronounce is None:
+                if vocabulary.has_key(word):
+                    del vocabulary[word]
+                if self._vocabulary.has_key(word):
+                    removed.add(word)
+                if added.has_key(word):
+                    del added[word]
+                continue
+            phones = self._pronouncer.pronounce(word, pronounce or None)
+            if len(phones) == 0:
+                self._logger.RTC_WARN("unknown pronunciation of the word: %s" % (word,))
+                continue
+            # a known word only gains the pronunciations it does not have
+            new = [p for p in phones if p not in vocabulary.get(word, [])]
+            if len(new) == 0:
+                continue
+            vocabulary[word] = vocabulary.get(word, []) + new
+            added[word] = added.get(word, []) + new
+        if len(added) == 0 and len(removed) == 0:
+            return
+        self._vocablock.acquire()
+        try:
+            self._vocabulary = vocabulary
+        finally:
+            self._vocablock.release()
+        self._logger.RTC_INFO("vocabulary: %i words added, %i words removed" % (len(added), len(removed)))
+        if self._j is None:
+            # applied when the engine is started
+            return
+        if self._srgs is None:
+            self.reloadvocabulary()
+            return
+        if self._vocabularyslot[0] == "":
+            self._logger.RTC_ERROR("vocabularyslot is not set")
+            return
+        if len(removed) > 0:
+            self._j.removewords(list(removed))
+        if len(added) > 0:
+            self._j.addwords(added.items(), self._vocabularyslot[0])
+
+    def reloadvocabulary(self):
+        # words can not be added to the N-gram of a running julius: start
+        # another julius with the new dictionary in the background and
+        # switch to it when it is ready (the models are loaded again and
+        # held twice in memory until then)
+        self._vocablock.acquire()
+        try:
+            if self._swapping:
+                self._swapagain = True
+                return
+            self._swapping = True
+        finally:
+            self._vocablock.release()
+        t = threading.Thread(target=self.swapengine)
+        t.setDaemon(True)
+        t.start()
+
+    def swapengine(self):
+        while True:
+            j = self.createengine()
+            if j is not None:
+                old = self._j
+                if old is None:
+                    # stopped in the meantime
+                    j.terminate()
+                    j.join()
+                else:
+                    self._j = j
+                    if self._active:
+                        j.resume()
+                    old.terminate()
+                    old.join()
+                    self._logger.RTC_INFO("switched to the engine with %i user words" % (len(self._vocabulary),))
+            self._vocablock.acquire()
+            try:
+                if self._swapagain == False:
+                    self._swapping = False
+                    return
+                self._swapagain = False
+            finally:
+                self._vocablock.release()
+
     def onActivated(self, ec_id):
         OpenRTM_aist.DataFlowComponentBase.onActivated(self, ec_id)
-        #self._lang = self._srgs._lang
-        self._j = JuliusWrap(self._lang)
-        self._j.start()
-        self._j.setcallback(self.onResult)
-        while self._j._gotinput == False:
-            time.sleep(0.1)
-        #for r in self._srgs._rules.keys():
-        #    gram = self._srgs.toJulius(r)
-        #    if gram == "":
-        #        return RTC.RTC_ERROR
-        #    self._logger.RTC_INFO("register grammar: %s" % (r,))
-        #    self._j.addgrammar(gram, r)
-        #self._j.switchgrammar(self._srgs._rootrule)
+        if self._j is not None and self._engineopts != self.engineoptions():
+            self._logger.RTC_INFO("restarting julius to apply the configuration")
+            self.stopengine()
+        if self._j is None:
+            if self.startengine() == False:
+                return RTC.RTC_ERROR
+        self._j.resume()
+        self._active = True
         return RTC.RTC_OK
 
     def onData(self, name, data):
         if self._j:
             if name == "data":
-                self._j.write(data.data)
+                if self._active:
+                    t = None
+                    if data.tm.sec != 0 or data.tm.nsec != 0:
+                        t = data.tm.sec + data.tm.nsec * 1e-9
+                    self._j.write(data.data, t)
             elif name == "activegrammar":
                 self._j.switchgrammar(data.data)
+        if name == "vocabulary":
+            self.updatevocabulary(data.data)
+
+    def updatevocabulary(self, text):
+        for l in text.decode('utf-8').splitlines():
+            if l.strip() == '':
+                continue
+            if l[0] == '-':
+                self.removewords([l[1:].strip()])
+            elif l.find('\t') >= 0:
+                (w, p) = l.split('\t', 1)
+                self.addwords([(w.strip(), p.strip())])
+            else:
+                self.addwords([l.strip()])
 
     def onExecute(self, ec_id):
         OpenRTM_aist.DataFlowComponentBase.onExecute(self, ec_id)
+        self.applyvocabulary()
         return RTC.RTC_OK
 
-    def onDeactivate(self, ec_id):
-        OpenRTM_aist.DataFlowComponentBase.onDeactivate(self, ec_id)
+    def onDeactivated(self, ec_id):
+        OpenRTM_aist.DataFlowComponentBase.onDeactivated(self, ec_id)
+        self._active = False
         if self._j:
-            self._j.terminate()
-            self._j.join()
-            self._j = None
+            self._j.pause()
         return RTC.RTC_OK
 
     def onFinalize(self):
         OpenRTM_aist.DataFlowComponentBase.onFinalize(self)
-        if self._j:
-            self._j.terminate()
-            self._j.join()
-            self._j = None
+        self.stopengine()
+        if self._userdict is not None:
+            os.remove(self._userdict)
+            self._userdict = None
         return RTC.RTC_OK
 
     def onResult(self, type, data):
         if type == JuliusWrap.CB_DOCUMENT:
-            d = data.first()
-            if d.name == 'input':
-                self._logger.RTC_INFO(d['status'])
-                self._statusdata.data = str(d['status'])
+            if isinstance(data, InputEvent):
+                self._logger.RTC_INFO(data._status)
+                self._statusdata.data = str(data._status)
                 self._statusport.write()
-            elif d.name == 'rejected':
+            elif isinstance(data, RejectedEvent):
                 self._logger.RTC_INFO('rejected')
                 self._statusdata.data = 'rejected'
                 self._statusport.write()
-            elif d.name == 'recogout':
-                doc = Document()
-                listentext = doc.createElement("listenText")
-                doc.appendChild(listentext)
-                for s in d.findAll('shypo'):
-                    hypo = doc.createElement("data")
-                    score = 0
-                    count = 0
-                    text = []
-                    for w in s.findAll('whypo'):
-                        #if w['word'][0] == '<':
-                        if w['word'] == "":
-                            continue
-                        whypo = doc.createElement("word")
-                        whypo.setAttribute("text", w['word'])
-                        whypo.setAttribute("score", w['cm'])
-                        hypo.appendChild(whypo)
-                        text.append(w['word'])
-                        score += float(w['cm'])
-                        count += 1
-                    if count == 0:
-                        score = 0
-                    else:
-                        score = score / count
-                    hypo.setAttribute("rank", s['rank'])
-                    hypo.setAttribute("score", str(score))
-                    hypo.setAttribute("likelihood", s['score'])
-                    hypo.setAttribute("text", " ".join(text))
-                    self._logger.RTC_INFO("#%s: %s (%s)" % (s['rank'], " ".join(text), str(score)))
-                    listentext.appendChild(hypo)
-                data = doc.toxml(encoding="utf-8")
-                #self._logger.RTC_INFO(data.decode('utf-8', 'backslashreplace'))
+            elif isinstance(data, RecogoutEvent):
+                # the dictation result keeps the sentence markers (only the
+                # empty words are left out)
+                results = resultformat.results(data._hypos, markers=True)
+                for r in results:
+                    self._logger.RTC_INFO("#%s: %s (%s)" % (r._rank, r._text, str(r._score)))
+                data = resultformat.toxml(results)
                 self._outdata.data = data
                 self._outport.write()
         elif type == JuliusWrap.CB_LOGWAVE:
-            t = os.stat(data).st_ctime
+            (t, self._logdata.data) = data
             tf = t - int(t)
             self._logdata.tm = RTC.Time(int(t - tf), int(tf * 1000000000))
-            try:
-                wf = wave.open(data, 'rb')
-                self._logdata.data = wf.readframes(wf.getnframes())
-                wf.close()
-                os.remove(data)
-                self._logport.write()
-            except:
-                pass
+            self._logport.write()
 
     def setgrammar(self, srgs):
         self._srgs = srgs
+        # (re)start the engine with the grammar profile
+        self.stopengine()
+        self.startengine()
 
 class JuliusDicRTCManager:
     def __init__(self):
@@ -416,9 +511,8 @@ class JuliusDicRTCManager:
         sys.stdout = codecs.getwriter(encoding)(sys.stdout, errors = "replace")
         sys.stderr = codecs.getwriter(encoding)(sys.stderr, errors = "replace")
 
-        #parser = utils.MyParser(version=__version__, usage="%prog [srgsfile]",
-        #                        description=__doc__)
-        parser = utils.MyParser(version=__version__, description=__doc__)
+        parser = utils.MyParser(version=__version__, usage="%prog [srgsfile]",
+                                description=__doc__)
         utils.addmanageropts(parser)
         #parser.add_option('-g', '--gui', dest='guimode', action="store_true",
         #                  default=False,
@@ -438,9 +532,9 @@ class JuliusDicRTCManager:
         #    parser.error("wrong number of arguments")
         #    sys.exit(1)
 
-        #self._grammars = args
-        #self._comp = {}
-        self._comp = None
+        # without grammars a single dictation component is created
+        self._grammars = args
+        self._comp = {}
         self._manager = OpenRTM_aist.Manager.init(utils.genmanagerargs(opts))
         self._manager.setModuleInitProc(self.moduleInit)
         self._manager.activateManager()
@@ -451,13 +545,14 @@ class JuliusDicRTCManager:
     def moduleInit(self, manager):
         profile = OpenRTM_aist.Properties(defaults_str = JuliusDicRTC_spec)
         manager.registerFactory(profile, JuliusDicRTC, OpenRTM_aist.Delete)
-        self._comp = manager.createComponent("JuliusDicRTC")
-        #for a in self._grammars:
-        #    print "compiling grammar: %s" % (a,)
-        #    srgs = SRGS(a)
-        #    print "done"
-        #    self._comp[a] = manager.createComponent("JuliusDicRTC?exec_cxt.periodic.rate=1")
-        #    self._comp[a].setgrammar(srgs)
+        if len(self._grammars) == 0:
+            self._comp[None] = manager.createComponent("JuliusDicRTC")
+        for a in self._grammars:
+            print "compiling grammar: %s" % (a,)
+            srgs = SRGS(a)
+            print "done"
+            self._comp[a] = manager.createComponent("JuliusDicRTC?exec_cxt.periodic.rate=1&conf.default.profile=grammar")
+            self._comp[a].setgrammar(srgs)
 
 def main():
     manager = JuliusDicRTCManager()
@@ -15,11 +15,16 @@ http://www.opensource.org/licenses/eclipse-1.0.txt
 
 import sys, os, socket, subprocess, signal, threading, platform
 import time, struct, traceback, locale, codecs, getopt, wave, tempfile
-import optparse
+import optparse, select, Queue, functools, multiprocessing, json
 from glob import glob
-from BeautifulSoup import BeautifulSoup
-from xml.dom.minidom import Document
 from openhrivoice.parsesrgs import *
+from openhrivoice.parsejuliusmodule import *
+from openhrivoice.grammarcache import GrammarCache
+from openhrivoice.juliuswrap import JuliusWrap, JuliusInstance
+from openhrivoice import voiceactivity
+from openhrivoice import resample
+from openhrivoice import resultformat
+from openhrivoice.latency import UtteranceTimeline, LatencyStats
 import OpenRTM_aist
 import RTC
 from openhrivoice.__init__ import __version__
@@ -33,191 +38,6 @@ except:
 
 __doc__ = _('Julius (English and Japanese) speech recognition component.')
 
-class JuliusWrap(threading.Thread):
-    CB_DOCUMENT = 1
-    CB_LOGWAVE = 2
-    
-    def __init__(self, language='jp'):
-        threading.Thread.__init__(self)
-        self._config = config()
-        self._running = False
-        self._platform = platform.system()
-        self._gotinput = False
-        self._lang = language
-        self._memsize = "large"
-        #self._memsize = "medium"
-        self._logdir = tempfile.mkdtemp()
-        self._callbacks = []
-        self._grammars = {}
-        self._firstgrammar = True
-        self._activegrammars = {}
-        self._prevdata = ''
-        self._modulesocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._audiosocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._cmdline = []
-        self._cmdline.append(self._config._julius_bin)
-        if self._lang in ('ja', 'jp'):
-            self._cmdline.extend(['-h',  self._config._julius_hmm_ja])
-            self._cmdline.extend(['-hlist', self._config._julius_hlist_ja])
-            self._cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy.dfa")])
-            self._cmdline.extend(["-v" , os.path.join(self._config._basedir, "dummy.dict")])
-            self._cmdline.extend(["-sb", "80.0"])
-        elif self._lang == 'de':
-            self._cmdline.extend(['-h',  self._config._julius_hmm_de])
-            self._cmdline.extend(['-hlist', self._config._julius_hlist_de])
-            self._cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy-en.dfa")])
-            self._cmdline.extend(["-v", os.path.join(self._config._basedir, "dummy-en.dict")])
-            self._cmdline.extend(["-sb", "160.0"])
-        #for chinese test
-        elif self._lang == 'cn':
-            self._cmdline.extend(['-h',  self._config._julius_hmm_cn])
-            self._cmdline.extend(['-hlist', self._config._julius_hlist_cn])
-            self._cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy-en.dfa")])
-            self._cmdline.extend(["-v", os.path.join(self._config._basedir, "test-cn.dict")])
-            self._cmdline.extend(["-sb", "160.0"])
-        else:
-            self._cmdline.extend(['-h',  self._config._julius_hmm_en])
-            self._cmdline.extend(['-hlist', self._config._julius_hlist_en])
-            self._cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy-en.dfa")])
-            self._cmdline.extend(["-v", os.path.join(self._config._basedir, "dummy-en.dict")])
-            self._cmdline.extend(["-sb", "160.0"])
-        self._audioport = self.getunusedport()
-        self._moduleport = self.getunusedport()
-        self._cmdline.extend(["-input", "adinnet",  "-adport",  str(self._audioport)])
-        self._cmdline.extend(["-module", str(self._moduleport)])
-        if self._memsize == "large":
-            #wu#self._cmdline.extend(["-b", "-1", "-b2", "120", "-s", "1000" ,"-m", "2000"])
-            self._cmdline.extend(["-b", "800", "-b2", "120", "-s", "1000" ,"-m", "2000"])
-        else:
-            #wu#self._cmdline.extend(["-b", "-1", "-b2", "80", "-s", "500" ,"-m", "1000"])
-            self._cmdline.extend(["-b", "800", "-b2", "80", "-s", "500" ,"-m", "1000"])
-        self._cmdline.extend(["-n", "5", "-output", "5"])
-        self._cmdline.extend(["-pausesegment", "-rejectshort", "200"])
-        self._cmdline.extend(["-nostrip"])
-        #self._cmdline.extend(["-multipath"])
-        #wu#self._cmdline.extend(["-multipath"]) #wu# for ver4.2 
-        #wu#self._cmdline.extend(["-spmodel", "sp", "-iwsp", "-iwsppenalty", "-70.0"])
-        self._cmdline.extend(["-spmodel", "sp"])
-        self._cmdline.extend(["-penalty1", "5.0", "-penalty2", "20.0", "-iwcd1", "max", "-gprune", "safe"])
-        self._cmdline.extend(["-record", self._logdir])
-        self._cmdline.extend(["-smpFreq", "16000"])
-        self._cmdline.extend(["-forcedict"])
-        #self._cmdline.extend(["-nolog"])
-        print "command line: %s" % " ".join(self._cmdline)
-        self._running = True
-        self._p = subprocess.Popen(self._cmdline)
-        print "connecting to ports"
-        for retry in range(0, 10):
-            try:
-                self._modulesocket.connect(("localhost", self._moduleport))
-            except socket.error:
-                time.sleep(1)
-                continue
-            break
-        for retry in range(0, 10):
-            try:
-                self._audiosocket.connect(("localhost", self._audioport))
-            except socket.error:
-                time.sleep(1)
-                continue
-            break
-        self._modulesocket.sendall("INPUTONCHANGE TERMINATE\n")
-        print "JuliusWrap started"
-
-    def getunusedport(self):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.bind(('localhost', 0))
-        addr, port = s.getsockname()
-        s.close()
-        return port
-
-    def terminate(self):
-        print 'JuliusWrap: terminate'
-        self._running = False
-        self._audiosocket.close()
-        self._modulesocket.close()
-        self._p.terminate()
-        return 0
-
-    def write(self, data):
-        try:
-            self._audiosocket.send(struct.pack("i", len(data)))
-            self._audiosocket.sendall(data)
-        except socket.error:
-            try:
-                self._audiosocket.connect(("localhost", self._audioport))
-            except:
-                pass
-        return 0
-
-    def run(self):
-        while self._running:
-            for f in glob(os.path.join(self._logdir, "*.wav")):
-                for c in self._callbacks:
-                    c(self.CB_LOGWAVE, f)
-            try:
-                self._modulesocket.settimeout(1)
-                data = self._prevdata + unicode(self._modulesocket.recv(1024*10), 'euc_jp')
-            except socket.timeout:
-                continue
-            except socket.error:
-                print 'socket error'
-                break
-            self._gotinput = True
-            ds = data.split(".\n")
-            self._prevdata = ds[-1]
-            ds = ds[0:-1]
-            for d in ds:
-                dx = BeautifulSoup(d)
-                for c in self._callbacks:
-                    c(self.CB_DOCUMENT, dx)
-        print 'JuliusWrap: exit from event loop'
-
-    def addgrammar(self, data, name):
-        if self._firstgrammar == True:
-            self._modulesocket.sendall("CHANGEGRAM %s\n" % (name,))
-            self._firstgrammar = False
-        else:
-            self._modulesocket.sendall("ADDGRAM %s\n" % (name,))
-        self._modulesocket.sendall(data.encode('euc_jp', 'backslashreplace'))
-        self._grammars[name] = len(self._grammars)
-        self._activegrammars[name] = True
-        time.sleep(0.1)
-
-    def activategrammar(self, name):
-        try:
-            gid = self._grammars[name]
-        except KeyError:
-            print "[error] unknown grammar: %s" % (name,)
-            return
-        print "ACTIVATEGRAM %s" % (name,)
-        self._modulesocket.sendall("ACTIVATEGRAM\n%s\n" % (name,))
-        self._activegrammars[name] = True
-        time.sleep(0.1)
-
-    def deactivategrammar(self, name):
-        try:
-            gid = self._grammars[name]
-        except KeyError:
-            print "[error] unknown grammar: %s" % (name,)
-            return
-        print "DEACTIVATEGRAM %s" % (name,)
-        self._modulesocket.sendall("DEACTIVATEGRAM\n%s\n" % (name,))
-        del self._activegrammars[name]
-        time.sleep(0.1)
-
-    def syncgrammar(self):
-        self._modulesocket.sendall("SYNCGRAM\n")
-
-    def switchgrammar(self, name):
-        self.activategrammar(name)
-        for g in self._activegrammars.keys():
-            if g != name:
-                self.deactivategrammar(g)
-
-    def setcallback(self, func):
-        self._callbacks.append(func)
-
 JuliusRTC_spec = ["implementation_id", "JuliusRTC",
                   "type_name",         "JuliusRTC",
                   "description",       __doc__.encode('UTF-8'),
@@ -236,10 +56,58 @@ JuliusRTC_spec = ["implementation_id", "JuliusRTC",
                   "conf.__descirption__.phonemodel", _("Specify acoustic model (fixed to male)").encode('UTF-8'),
                   "conf.__widget__.phonemodel", "radio",
                   "conf.__constraints__.phonemodel", "(male)",
+                  "conf.default.inputrate", "16000",
+                  "conf.__descirption__.inputrate", _("Sampling rate of the input audio (converted to 16000Hz for julius).").encode('UTF-8'),
+                  "conf.default.inputchannels", "1",
+                  "conf.__descirption__.inputchannels", _("Number of channels of the input audio (mixed down to mono).").encode('UTF-8'),
+                  "conf.default.inputformat", "int16",
+                  "conf.__descirption__.inputformat", _("Sample format of the input audio.").encode('UTF-8'),
+                  "conf.__widget__.inputformat", "radio",
+                  "conf.__constraints__.inputformat", "(int16, int32, float32)",
                   "conf.default.voiceactivitydetection", "internal",
-                  "conf.__descirption__.voiceactivitydetection", _("Specify voice activity detection trigger (fixed to internal).").encode('UTF-8'),
+                  "conf.__descirption__.voiceactivitydetection", _("Specify voice activity detection trigger (internal: julius only, numpy: forward only the speech regions to julius).").encode('UTF-8'),
                   "conf.__widget__.voiceactivitydetection", "radio",
-                  "conf.__constraints__.voiceactivitydetection", "(internal)",
+                  "conf.__constraints__.voiceactivitydetection", "(internal, numpy)",
+                  "conf.default.vadlevel", "-40",
+                  "conf.__descirption__.vadlevel", _("Energy threshold of the voice activity detection in dBFS.").encode('UTF-8'),
+                  "conf.default.vadhangover", "500",
+                  "conf.__descirption__.vadhangover", _("Length of silence in milliseconds to end the speech region.").encode('UTF-8'),
+                  "conf.default.vadpreroll", "300",
+                  "conf.__descirption__.vadpreroll", _("Length of audio in milliseconds forwarded before the start of the speech region.").encode('UTF-8'),
+                  "conf.default.overloadpolicy", "block",
+                  "conf.__descirption__.overloadpolicy", _("Specify what to do with the audio when the recognizer can not keep up.").encode('UTF-8'),
+                  "conf.__widget__.overloadpolicy", "radio",
+                  "conf.__constraints__.overloadpolicy", "(block, drop-oldest, skip-to-live)",
+                  "conf.default.progressive", "off",
+                  "conf.__descirption__.progressive", _("Publish interim results of the first pass on the partial port (applied on the next activation).").encode('UTF-8'),
+                  "conf.__widget__.progressive", "radio",
+                  "conf.__constraints__.progressive", "(on, off)",
+                  "conf.default.partialinterval", "300",
+                  "conf.__descirption__.partialinterval", _("Interval of the interim results in milliseconds.").encode('UTF-8'),
+                  "conf.default.format", "xml",
+                  "conf.__descirption__.format", _("Format of the recognition results (xml: listenText document, json: compact N-best list).").encode('UTF-8'),
+                  "conf.__widget__.format", "radio",
+                  "conf.__constraints__.format", "(xml, json)",
+                  "conf.default.metrics", "off",
+                  "conf.__descirption__.metrics", _("Publish the latency of each utterance on the metrics port.").encode('UTF-8'),
+                  "conf.__widget__.metrics", "radio",
+                  "conf.__constraints__.metrics", "(on, off)",
+                  "conf.default.beam", "800",
+                  "conf.__descirption__.beam", _("Beam width of the first pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.beam2", "120",
+                  "conf.__descirption__.beam2", _("Beam width of the second pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.stacksize", "1000",
+                  "conf.__descirption__.stacksize", _("Stack size of the second pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.overflow", "2000",
+                  "conf.__descirption__.overflow", _("Maximum number of hypotheses expanded in the second pass (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.nbest", "5",
+                  "conf.__descirption__.nbest", _("Number of sentence candidates (applied on the next activation).").encode('UTF-8'),
+                  "conf.default.audiotransport", "adinnet",
+                  "conf.__descirption__.audiotransport", _("Transport of the audio to julius (pipe: standard input of julius, lighter than the adinnet connection) (applied on the next activation).").encode('UTF-8'),
+                  "conf.__widget__.audiotransport", "radio",
+                  "conf.__constraints__.audiotransport", "(adinnet, pipe)",
+                  "conf.default.streams", "1",
+                  "conf.__descirption__.streams", _("Number of audio streams (one julius each). Ports of stream N are suffixed with N (e.g. data1, result1), stream 0 uses the plain names (fixed on startup).").encode('UTF-8'),
                   ""]
 
 class DataListener(OpenRTM_aist.ConnectorDataListenerT):
@@ -257,8 +125,25 @@ class JuliusRTC(OpenRTM_aist.DataFlowComponentBase):
     def __init__(self, manager):
         OpenRTM_aist.DataFlowComponentBase.__init__(self, manager)
         self._lang = 'cn'
+        self._nstreams = 1
         self._srgs = None
-        self._j = None
+        self._j = []
+        self._shared = None
+        self._data = {}
+        self._port = {}
+        self._streamof = {}
+        self._active = False
+        self._activegrammar = None
+        self._engineopts = None
+        self._partialtime = {}
+        self._counters = {}
+        self._health = {}
+        self._vad = {}
+        self._converter = {}
+        self._timeline = {}
+        self._stats = LatencyStats()
+        self._statslock = threading.Lock()
+        self._portlock = threading.Lock() # outports are written from the julius and the inport threads
         self._copyrights = ['''
 Large Vocabulary Continuous Speech Recognition Engine Julius
 (http://julius.sourceforge.jp/)
@@ -279,36 +164,67 @@ Copyright (c) 2005-2009 Free Software Foundation
         self._logger = OpenRTM_aist.Manager.instance().getLogbuf(self._properties.getProperty("instance_name"))
         self._logger.RTC_INFO("JuliusRTC version " + __version__)
         self._logger.RTC_INFO("Copyright (C) 2010-2011 Yosuke Matsusaka")
-        # create inport for audio stream
-        self._indata = RTC.TimedOctetSeq(RTC.Time(0,0), None)
-        self._inport = OpenRTM_aist.InPort("data", self._indata)
-        self._inport.appendProperty('description', _('Audio data (in packets) to be recognized.').encode('UTF-8'))
-        self._inport.addConnectorDataListener(OpenRTM_aist.ConnectorDataListenerType.ON_BUFFER_WRITE,
-                                              DataListener("data", self, RTC.TimedOctetSeq))
-        self.registerInPort(self._inport._name, self._inport)
-        # create inport for active grammar
-        self._grammardata = RTC.TimedString(RTC.Time(0,0), "")
-        self._grammarport = OpenRTM_aist.InPort("activegrammar", self._grammardata)
-        self._grammarport.appendProperty('description', _('Grammar ID to be activated.').encode('UTF-8'))
-        self._grammarport.addConnectorDataListener(OpenRTM_aist.ConnectorDataListenerType.ON_BUFFER_WRITE,
-                                                   DataListener("activegrammar", self, RTC.TimedString))
-        self.registerInPort(self._grammarport._name, self._grammarport)
-        # create outport for status
-        self._statusdata = RTC.TimedString(RTC.Time(0,0), "")
-        self._statusport = OpenRTM_aist.OutPort("status", self._statusdata)
-        self._statusport.appendProperty('description',
-                                        _('Status of the recognizer (one of "LISTEN [accepting speech]", "STARTREC [start recognition process]", "ENDREC [end recognition process]", "REJECTED [rejected speech input]")').encode('UTF-8'))
-        self.registerOutPort(self._statusport._name, self._statusport)
-        # create outport for result
-        self._outdata = RTC.TimedString(RTC.Time(0,0), "")
-        self._outport = OpenRTM_aist.OutPort("result", self._outdata)
-        self._outport.appendProperty('description', _('Recognition result in XML format.').encode('UTF-8'))
-        self.registerOutPort(self._outport._name, self._outport)
-        # create outport for log
-        self._logdata = RTC.TimedOctetSeq(RTC.Time(0,0), None)
-        self._logport = OpenRTM_aist.OutPort("log", self._logdata)
-        self._logport.appendProperty('description', _('Log of audio data.').encode('UTF-8'))
-        self.registerOutPort(self._logport._name, self._logport)
+        # configuration parameters
+        self._overloadpolicy = ["block",]
+        self.bindParameter("overloadpolicy", self._overloadpolicy, "block")
+        self._audiotransport = ["adinnet",]
+        self.bindParameter("audiotransport", self._audiotransport, "adinnet")
+        self._streams = [1,]
+        self.bindParameter("streams", self._streams, "1")
+        # the ports are created for the number of streams given on startup
+        try:
+            self._nstreams = max(int(utils.initialparameter(self._properties, "streams", "1")), 1)
+        except ValueError:
+            self._logger.RTC_ERROR("invalid number of streams")
+            self._nstreams = 1
+        self._progressive = ["off",]
+        self.bindParameter("progressive", self._progressive, "off")
+        self._partialinterval = [300,]
+        self.bindParameter("partialinterval", self._partialinterval, "300")
+        self._inputrate = [16000,]
+        self.bindParameter("inputrate", self._inputrate, "16000")
+        self._inputchannels = [1,]
+        self.bindParameter("inputchannels", self._inputchannels, "1")
+        self._inputformat = ["int16",]
+        self.bindParameter("inputformat", self._inputformat, "int16")
+        self._voiceactivitydetection = ["internal",]
+        self.bindParameter("voiceactivitydetection", self._voiceactivitydetection, "internal")
+        self._vadlevel = [-40.0,]
+        self.bindParameter("vadlevel", self._vadlevel, "-40")
+        self._vadhangover = [500,]
+        self.bindParameter("vadhangover", self._vadhangover, "500")
+        self._vadpreroll = [300,]
+        self.bindParameter("vadpreroll", self._vadpreroll, "300")
+        self._beam = [800,]
+        self.bindParameter("beam", self._beam, "800")
+        self._beam2 = [120,]
+        self.bindParameter("beam2", self._beam2, "120")
+        self._stacksize = [1000,]
+        self.bindParameter("stacksize", self._stacksize, "1000")
+        self._overflow = [2000,]
+        self.bindParameter("overflow", self._overflow, "2000")
+        self._nbest = [5,]
+        self.bindParameter("nbest", self._nbest, "5")
+        self._format = ["xml",]
+        self.bindParameter("format", self._format, "xml")
+        self._metrics = ["off",]
+        self.bindParameter("metrics", self._metrics, "off")
+        # create inport for active grammar (shared by all the streams)
+        self.createInPort("activegrammar", RTC.TimedString, _('Grammar ID to be activated.'))
+        # create ports for each audio stream (stream 0 has no suffix)
+        for i in range(0, self._nstreams):
+            self.createInPort(self.portname("data", i), RTC.TimedOctetSeq,
+                              _('Audio data (in packets) to be recognized.'), i)
+            self.createOutPort(self.portname("status", i), RTC.TimedString,
+                               _('Status of the recognizer (one of "LISTEN [accepting speech]", "STARTREC [start recognition process]", "ENDREC [end recognition process]", "REJECTED [rejected speech input]", and "VAD_STARTREC", "VAD_LISTEN" from the voice activity detection of numpy)'))
+            self.createOutPort(self.portname("result", i), RTC.TimedString,
+                               _('Recognition result in XML (or JSON) format.'))
+            self.createOutPort(self.portname("partial", i), RTC.TimedString,
+                               _('Interim recognition result in XML (or JSON) format (enabled by the progressive parameter).'))
+            self.createOutPort(self.portname("log", i), RTC.TimedOctetSeq,
+                               _('Log of audio data.'))
+            self.createOutPort(self.portname("metrics", i), RTC.TimedString,
+                               _('Latency of each utterance and restarts of julius in JSON format (enabled by the metrics parameter).'))
 
         self._logger.RTC_INFO("This component depends on following softwares and datas:")
         self._logger.RTC_INFO('')
@@ -319,109 +235,284 @@ Copyright (c) 2005-2009 Free Software Foundation
 
         return RTC.RTC_OK
 
-    def onActivated(self, ec_id):
-        OpenRTM_aist.DataFlowComponentBase.onActivated(self, ec_id)
+    def portname(self, name, stream):
+        if stream == 0:
+            return name
+        return name + str(stream)
+
+    def createInPort(self, name, type, description, stream=None):
+        self._data[name] = type(RTC.Time(0,0), None)
+        self._port[name] = OpenRTM_aist.InPort(name, self._data[name])
+        self._port[name].appendProperty('description', description.encode('UTF-8'))
+        self._port[name].addConnectorDataListener(OpenRTM_aist.ConnectorDataListenerType.ON_BUFFER_WRITE,
+                                                  DataListener(name, self, type))
+        self.registerInPort(name, self._port[name])
+        self._streamof[name] = stream
+
+    def createOutPort(self, name, type, description):
+        self._data[name] = type(RTC.Time(0,0), None)
+        self._port[name] = OpenRTM_aist.OutPort(name, self._data[name])
+        self._port[name].appendProperty('description', description.encode('UTF-8'))
+        self.registerOutPort(name, self._port[name])
+
+    def writeport(self, name, stream, data, tm=None):
+        name = self.portname(name, stream)
+        self._portlock.acquire()
+        try:
+            self._data[name].data = data
+            if tm is not None:
+                self._data[name].tm = tm
+            self._port[name].write()
+        finally:
+            self._portlock.release()
+
+    def engineoptions(self):
+        # startup options of julius taken from the configuration parameters
+        opts = {'beam': self._beam[0], 'beam2': self._beam2[0], 'stack': self._stacksize[0],
+                'overflow': self._overflow[0], 'nbest': self._nbest[0],
+                'transport': self._audiotransport[0]}
+        if self._progressive[0] == 'on':
+            opts['proginterval'] = self._partialinterval[0]
+        return opts
+
+    def startengine(self):
         self._lang = self._srgs._lang
-        self._j = JuliusWrap(self._lang)
-        self._j.start()
-        self._j.setcallback(self.onResult)
-        while self._j._gotinput == False:
-            time.sleep(0.1)
-        for r in self._srgs._rules.keys():
-            gram = self._srgs.toJulius(r)
+        self._engineopts = self.engineoptions()
+        grams = GrammarCache().compileall(self._srgs)
+        for (r, gram) in grams:
             if gram == "":
-                return RTC.RTC_ERROR
+                return False
             self._logger.RTC_INFO("register grammar: %s" % (r,))
-            self._j.addgrammar(gram, r)
-        self._j.switchgrammar(self._srgs._rootrule)
+        ncpu = multiprocessing.cpu_count()
+        nstreams = self._nstreams
+        if self._shared is not None and nstreams > 1:
+            self._logger.RTC_ERROR("a shared julius recognizes only one stream")
+            nstreams = 1
+        for i in range(0, nstreams):
+            # one julius per stream, spread over the cpu cores
+            cpu = None
+            if self._nstreams > 1:
+                cpu = i % ncpu
+            if self._shared is not None:
+                # recognizer in a julius shared with other components
+                j = self._shared
+            else:
+                j = JuliusWrap(self._lang, cpu, self._engineopts)
+            j.setcallback(functools.partial(self.onResult, stream=i))
+            j.start()
+            self._j.append(j)
+            if j.waitready() == False:
+                self._logger.RTC_ERROR("julius is not responding")
+                self.stopengine()
+                return False
+            if j.addgrammars(grams) == False:
+                self._logger.RTC_ERROR("julius refused the grammars")
+                self.stopengine()
+                return False
+        if self._activegrammar is None:
+            self._activegrammar = self._srgs._rootrule
+        self.switchgrammar(self._activegrammar)
+        # keep the engines idle until the component is activated
+        for j in self._j:
+            j.pause()
+        return True
+
+    def stopengine(self):
+        for j in self._j:
+            j.terminate()
+            j.join()
+        self._j = []
+        self._counters = {}
+        self._health = {}
+
+    def onActivated(self, ec_id):
+        OpenRTM_aist.DataFlowComponentBase.onActivated(self, ec_id)
+        if self._shared is not None and not self._shared.feedsaudio() and \
+                len(self._port["data"].get_connector_profiles()) > 0:
+            self._logger.RTC_ERROR("the audio of the shared julius is taken by the component of the first grammar, leave the data port of this one unconnected")
+            return RTC.RTC_ERROR
+        if len(self._j) > 0 and self._engineopts != self.engineoptions():
+            if self._shared is None:
+                self._logger.RTC_INFO("restarting julius to apply the configuration")
+                self.stopengine()
+            elif self._shared.reconfigure(self.engineoptions()):
+                self._logger.RTC_INFO("applied the configuration to the shared julius")
+                self._engineopts = self.engineoptions()
+            else:
+                self._logger.RTC_ERROR("the configuration conflicts with the shared julius (audiotransport), keeping the previous one")
+        if len(self._j) == 0:
+            if self.startengine() == False:
+                return RTC.RTC_ERROR
+        self._converter = {}
+        if self._inputrate[0] != 16000 or self._inputchannels[0] != 1 or self._inputformat[0] != 'int16':
+            if resample.numpy is None:
+                self._logger.RTC_ERROR("numpy is required to convert %i Hz %i ch %s audio" % (self._inputrate[0], self._inputchannels[0], self._inputformat[0]))
+                return RTC.RTC_ERROR
+            for i in range(0, len(self._j)):
+                self._converter[i] = resample.StreamResampler(self._inputrate[0], 16000,
+                                                              self._inputchannels[0], self._inputformat[0])
+        self._vad = {}
+        if self._voiceactivitydetection[0] == 'numpy':
+            if voiceactivity.numpy is None:
+                self._logger.RTC_ERROR("numpy is not installed: falling back to internal voice activity detection")
+            else:
+                for i in range(0, len(self._j)):
+                    self._vad[i] = voiceactivity.VoiceActivityDetector(level=float(self._vadlevel[0]),
+                                                                       hangover=self._vadhangover[0] / 1000.0,
+                                                                       preroll=self._vadpreroll[0] / 1000.0)
+        for j in self._j:
+            j.setoverloadpolicy(self._overloadpolicy[0])
+            j.resume()
+        self._active = True
         return RTC.RTC_OK
 
     def onData(self, name, data):
-        if self._j:
-            if name == "data":
-                self._j.write(data.data)
-            elif name == "activegrammar":
-                self._j.switchgrammar(data.data)
+        if len(self._j) > 0:
+            if name == "activegrammar":
+                self.switchgrammar(data.data)
+            elif self._active:
+                stream = self._streamof[name]
+                t = None
+                if data.tm.sec != 0 or data.tm.nsec != 0:
+                    t = data.tm.sec + data.tm.nsec * 1e-9
+                audio = data.data
+                conv = self._converter.get(stream)
+                if conv is not None:
+                    audio = conv.process(audio)
+                chunks = [(audio, t)]
+                vad = self._vad.get(stream)
+                if vad is not None:
+                    if t is None:
+                        t = time.time()
+                    (chunks, events) = vad.process(audio, t)
+                    # transitions of the gate are told apart from the ones
+                    # of julius (which alone mark the timeline)
+                    for e in events:
+                        self._logger.RTC_INFO("vad: " + e)
+                        self.writeport("status", stream, "VAD_" + e)
+                for (audio, t) in chunks:
+                    if audio == '':
+                        continue
+                    self.timeline(stream).mark('firstaudio')
+                    self._j[stream].write(audio, t)
+
+    def switchgrammar(self, name):
+        self._activegrammar = name
+        for i in range(0, len(self._j)):
+            t = self._j[i].switchgrammar(name)
+            if t is not None:
+                self._logger.RTC_INFO("switched grammar of stream %i to %s in %.3f sec" % (i, name, t))
+            else:
+                self._logger.RTC_ERROR("unable to switch grammar of stream %i to %s" % (i, name))
 
     def onExecute(self, ec_id):
         OpenRTM_aist.DataFlowComponentBase.onExecute(self, ec_id)
+        for i in range(0, len(self._j)):
+            c = self._j[i]._sender.counters()
+            p = self._counters.get(i)
+            if p is not None and (c['dropped'] != p['dropped'] or c['late'] != p['late']):
+                self._logger.RTC_WARN("audio overload on stream %i: %i bytes dropped, %i bytes late (policy: %s)" % (i, c['dropped'], c['late'], self._overloadpolicy[0]))
+            self._counters[i] = c
+            h = self._j[i].health()
+            p = self._health.get(i)
+            if p is not None and h['restarts'] != p['restarts']:
+                self._logger.RTC_WARN("julius of stream %i restarted (%i restarts, %.1f sec down in total)" % (i, h['restarts'], h['downtime']))
+            if self._metrics[0] == 'on' and (p is None or h['restarts'] != p['restarts'] or h['alive'] != p['alive']):
+                m = {'stream': i, 'restarts': h['restarts'], 'alive': h['alive'],
+                     'downtime': round(h['downtime'] * 1000, 3)}
+                self.writeport("metrics", i, json.dumps(m, sort_keys=True))
+            self._health[i] = h
         return RTC.RTC_OK
 
-    def onDeactivate(self, ec_id):
-        OpenRTM_aist.DataFlowComponentBase.onDeactivate(self, ec_id)
-        if self._j:
-            self._j.terminate()
-            self._j.join()
-            self._j = None
+    def onDeactivated(self, ec_id):
+        OpenRTM_aist.DataFlowComponentBase.onDeactivated(self, ec_id)
+        self._active = False
+        for j in self._j:
+            j.pause()
         return RTC.RTC_OK
 
     def onFinalize(self):
         OpenRTM_aist.DataFlowComponentBase.onFinalize(self)
-        if self._j:
-            self._j.terminate()
-            self._j.join()
-            self._j = None
+        self.stopengine()
         return RTC.RTC_OK
 
-    def onResult(self, type, data):
+    def onResult(self, type, data, stream=0):
         if type == JuliusWrap.CB_DOCUMENT:
-            d = data.first()
-            if d.name == 'input':
-                self._logger.RTC_INFO(d['status'])
-                self._statusdata.data = str(d['status'])
-                self._statusport.write()
-            elif d.name == 'rejected':
+            if isinstance(data, InputEvent):
+                self._logger.RTC_INFO(data._status)
+                if data._status in ('STARTREC', 'ENDREC'):
+                    self.timeline(stream).mark(data._status.lower(), data._received)
+                self.writeport("status", stream, str(data._status))
+            elif isinstance(data, RejectedEvent):
                 self._logger.RTC_INFO('rejected')
-                self._statusdata.data = 'rejected'
-                self._statusport.write()
-            elif d.name == 'recogout':
-                doc = Document()
-                listentext = doc.createElement("listenText")
-                doc.appendChild(listentext)
-                for s in d.findAll('shypo'):
-                    hypo = doc.createElement("data")
-                    score = 0
-                    count = 0
-                    text = []
-                    for w in s.findAll('whypo'):
-                        if w['word'][0] == '<':
-                            continue
-                        whypo = doc.createElement("word")
-                        whypo.setAttribute("text", w['word'])
-                        whypo.setAttribute("score", w['cm'])
-                        hypo.appendChild(whypo)
-                        text.append(w['word'])
-                        score += float(w['cm'])
-                        count += 1
-                    if count == 0:
-                        score = 0
-                    else:
-                        score = score / count
-                    hypo.setAttribute("rank", s['rank'])
-                    hypo.setAttribute("score", str(score))
-                    hypo.setAttribute("likelihood", s['score'])
-                    hypo.setAttribute("text", " ".join(text))
-                    self._logger.RTC_INFO("#%s: %s (%s)" % (s['rank'], " ".join(text), str(score)))
-                    listentext.appendChild(hypo)
-                data = doc.toxml(encoding="utf-8")
-                #self._logger.RTC_INFO(data.decode('utf-8', 'backslashreplace'))
-                self._outdata.data = data
-                self._outport.write()
+                self._timeline.pop(stream, None)
+                self.writeport("status", stream, 'rejected')
+            elif data._name == 'INPUTPARAM':
+                try:
+                    self.timeline(stream).setduration(float(data.get('MSEC')) / 1000.0)
+                except (TypeError, ValueError):
+                    pass
+            elif isinstance(data, RecogoutEvent):
+                if len(data._hypos) > 0 and data._hypos[0]._name == 'PHYPO':
+                    # interim result of the first pass
+                    now = time.time()
+                    if now - self._partialtime.get(stream, 0) >= self._partialinterval[0] / 1000.0:
+                        self._partialtime[stream] = now
+                        self.writeport("partial", stream, self.formatresult(data._hypos, False))
+                    return
+                tl = self.timeline(stream)
+                tl.mark('recogout', data._received)
+                result = self.formatresult(data._hypos)
+                tl.mark('built')
+                self.writeport("result", stream, result)
+                tl.mark('written')
+                self.finishtimeline(stream)
         elif type == JuliusWrap.CB_LOGWAVE:
-            t = os.stat(data).st_ctime
+            (t, wavdata) = data
             tf = t - int(t)
-            self._logdata.tm = RTC.Time(int(t - tf), int(tf * 1000000000))
-            try:
-                wf = wave.open(data, 'rb')
-                self._logdata.data = wf.readframes(wf.getnframes())
-                wf.close()
-                os.remove(data)
-                self._logport.write()
-            except:
-                pass
-
-    def setgrammar(self, srgs):
+            self.writeport("log", stream, wavdata, RTC.Time(int(t - tf), int(tf * 1000000000)))
+
+    def timeline(self, stream):
+        tl = self._timeline.get(stream)
+        if tl is None:
+            tl = UtteranceTimeline()
+            self._timeline[stream] = tl
+        return tl
+
+    def finishtimeline(self, stream):
+        tl = self._timeline.pop(stream, None)
+        if tl is None:
+            return
+        intervals = tl.intervals()
+        rtf = tl.rtf()
+        self._statslock.acquire()
+        try:
+            self._stats.add(intervals, rtf)
+            if self._stats.count() % 20 == 0:
+                self._logger.RTC_INFO("latency: " + self._stats.summary())
+        finally:
+            self._statslock.release()
+        if self._metrics[0] == 'on':
+            m = {'stream': stream, 'rtf': rtf}
+            for (k, v) in intervals.items():
+                m[k] = round(v * 1000, 3) # in milliseconds
+            self.writeport("metrics", stream, json.dumps(m, sort_keys=True))
+
+    def formatresult(self, hypos, log=True):
+        results = resultformat.results(hypos)
+        if log:
+            for r in results:
+                self._logger.RTC_INFO("#%s: %s (%s)" % (r._rank, r._text, str(r._score)))
+        if self._format[0] == 'json':
+            return resultformat.tojson(results)
+        return resultformat.toxml(results)
+
+    def setgrammar(self, srgs, shared=None):
+        # shared is a JuliusInstance in the multi-instance mode
         self._srgs = srgs
+        self._shared = shared
+        # prestart the engine so that activation does not wait for julius
+        self.startengine()
 
 class JuliusRTCManager:
     def __init__(self):
@@ -435,6 +526,12 @@ class JuliusRTCManager:
         parser.add_option('-g', '--gui', dest='guimode', action="store_true",
                           default=False,
                           help=_('show file open dialog in GUI'))
+        parser.add_option('-s', '--streams', dest='streams', action="store",
+                          type="int", default=1,
+                          help=_('number of audio streams to be recognized by each component'))
+        parser.add_option('-m', '--multi-instance', dest='multiinstance', action="store_true",
+                          default=False,
+                          help=_('recognize the grammars (of the same language) in a single julius sharing the acoustic model (the audio of the component of the first grammar is recognized by all, the data ports of the others are to be left unconnected)'))
         try:
             opts, args = parser.parse_args()
         except optparse.OptionError, e:
@@ -449,8 +546,14 @@ class JuliusRTCManager:
         if len(args) == 0:
             parser.error("wrong number of arguments")
             sys.exit(1)
+        if opts.multiinstance == True and opts.streams > 1:
+            parser.error("multi-instance mode supports only one stream")
+            sys.exit(1)
 
         self._grammars = args
+        self._streams = opts.streams
+        self._multiinstance = opts.multiinstance
+        self._julius = []
         self._comp = {}
         self._manager = OpenRTM_aist.Manager.init(utils.genmanagerargs(opts))
         self._manager.setModuleInitProc(self.moduleInit)
@@ -462,12 +565,43 @@ class JuliusRTCManager:
     def moduleInit(self, manager):
         profile = OpenRTM_aist.Properties(defaults_str = JuliusRTC_spec)
         manager.registerFactory(profile, JuliusRTC, OpenRTM_aist.Delete)
+        srgss = []
         for a in self._grammars:
             print "compiling grammar: %s" % (a,)
-            srgs = SRGS(a)
+            srgss.append((a, SRGS(a)))
             print "done"
-            self._comp[a] = manager.createComponent("JuliusRTC?exec_cxt.periodic.rate=1")
-            self._comp[a].setgrammar(srgs)
+        for (a, srgs) in srgss:
+            self._comp[a] = manager.createComponent("JuliusRTC?exec_cxt.periodic.rate=1&conf.default.streams=%i" % (self._streams,))
+        shared = {}
+        if self._multiinstance == True:
+            shared = self.sharejulius(srgss)
+        for (a, srgs) in srgss:
+            self._comp[a].setgrammar(srgs, shared.get(a))
+
+    def sharejulius(self, srgss):
+        # one julius per language with one recognizer instance per grammar
+        langs = []
+        for (a, srgs) in srgss:
+            if srgs._lang not in langs:
+                langs.append(srgs._lang)
+        ret = {}
+        for lang in langs:
+            grammars = [a for (a, srgs) in srgss if srgs._lang == lang]
+            names = ["sr%i" % (i,) for i in range(0, len(grammars))]
+            # each recognizer is given the options of its component
+            options = [self._comp[a].engineoptions() for a in grammars]
+            transports = set([o['transport'] for o in options])
+            if len(transports) > 1:
+                print "[error] the components of language %s use different audio transports (%s): not sharing julius" % (lang, ", ".join(sorted(transports)))
+                continue
+            j = JuliusWrap(lang, None, {'instances': names, 'transport': transports.pop(),
+                                        'instanceoptions': dict(zip(names, options))})
+            j.start()
+            self._julius.append(j)
+            print "audio of the shared julius (%s) is taken from the component of %s" % (lang, grammars[0])
+            for i in range(0, len(grammars)):
+                ret[grammars[i]] = JuliusInstance(j, names[i], feeder=(i == 0))
+        return ret
 
 def main():
     manager = JuliusRTCManager()
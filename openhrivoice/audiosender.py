@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Asynchronous audio sender
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import time
+import threading
+from collections import deque
+
+class AudioSender(threading.Thread):
+    """ Send audio packets from a dedicated thread.
+
+    write() only queues the packet into a bounded buffer so that the caller
+    (the inport listener) never waits for the recognizer. The sender thread
+    coalesces every queued packet into a single frame per call of sendfunc,
+    which also receives the time of the first sample of the frame.
+    When the buffer is full the overload policy decides what happens:
+
+    block         -- the writer waits for free space
+    drop-oldest   -- the oldest packets are discarded to make space
+    skip-to-live  -- everything queued is discarded and sending resumes
+                     from the newest packet
+    """
+
+    POLICIES = ('block', 'drop-oldest', 'skip-to-live')
+
+    def __init__(self, sendfunc, maxbytes=64000, maxframe=32000, policy='block', latethreshold=0.5):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self._sendfunc = sendfunc
+        self._maxbytes = maxbytes
+        self._maxframe = maxframe
+        self._latethreshold = latethreshold
+        self._policy = 'block'
+        self.setpolicy(policy)
+        self._queue = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._running = True
+        # counters (in bytes except for frames, packets and delays in seconds)
+        self._sent = 0
+        self._dropped = 0
+        self._late = 0
+        self._frames = 0
+        self._packets = 0
+        self._delay = 0.0 # sum of the queueing delay of the sent packets
+        self._maxdelay = 0.0
+
+    def setpolicy(self, policy):
+        if policy not in self.POLICIES:
+            print "[error] unknown overload policy: %s" % (policy,)
+            return
+        self._policy = policy
+
+    def write(self, data, t=None):
+        # t is the time of the first sample (defaults to now)
+        if t is None:
+            t = time.time()
+        self._cond.acquire()
+        try:
+            if self._size + len(data) > self._maxbytes:
+                if self._policy == 'block':
+                    while self._running and self._size > 0 and self._size + len(data) > self._maxbytes:
+                        self._cond.wait(1.0)
+                elif self._policy == 'drop-oldest':
+                    while self._size > 0 and self._size + len(data) > self._maxbytes:
+                        self.dropone()
+                else:
+                    while self._size > 0:
+                        self.dropone()
+            self._queue.append((time.time(), t, data))
+            self._size += len(data)
+            self._packets += 1
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+        return 0
+
+    def dropone(self):
+        (q, t, data) = self._queue.popleft()
+        self._size -= len(data)
+        self._dropped += len(data)
+
+    def run(self):
+        while True:
+            self._cond.acquire()
+            try:
+                while self._running and self._size == 0:
+                    self._cond.wait()
+                if not self._running:
+                    break
+                now = time.time()
+                chunks = []
+                size = 0
+                while len(self._queue) > 0 and (size == 0 or size + len(self._queue[0][2]) <= self._maxframe):
+                    (q, t, data) = self._queue.popleft()
+                    if now - q > self._latethreshold:
+                        self._late += len(data)
+                    self._delay += now - q
+                    self._maxdelay = max(self._maxdelay, now - q)
+                    if size == 0:
+                        t0 = t
+                    chunks.append(data)
+                    size += len(data)
+                self._size -= size
+                self._cond.notifyAll()
+            finally:
+                self._cond.release()
+            self._sendfunc("".join(chunks), t0)
+            self._sent += size
+            self._frames += 1
+
+    def counters(self):
+        return {'sent': self._sent, 'dropped': self._dropped, 'late': self._late,
+                'frames': self._frames, 'packets': self._packets, 'queued': self._size,
+                'delay': self._delay, 'maxdelay': self._maxdelay}
+
+    def terminate(self):
+        self._cond.acquire()
+        self._running = False
+        self._cond.notifyAll()
+        self._cond.release()
@@ -41,6 +41,7 @@ class config():
             os.makedirs(self._configdir)
 
         self._lexicondb = os.path.join(self._configdir, 'lexcon.db')
+        self._grammarcachedir = os.path.join(self._configdir, 'grammarcache')
 
         if self._platform == "Windows":
             self._julius_runkitdir = os.path.join(self._basedir, "3rdparty", "dictation-kit-v4.0-win")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Cache of compiled Julius grammars
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import os
+import codecs
+import tempfile
+from openhrivoice.config import config
+
+class GrammarCache:
+    """ Utility class to store compiled grammars (DFA and dictionary text) on disk.
+
+    Entries are keyed by SRGS.cachekey(), so an entry is only reused when the
+    grammar, its lexicons and the converter are unchanged.
+    """
+
+    def __init__(self, dirname=None):
+        if dirname is None:
+            dirname = config()._grammarcachedir
+        self._dir = dirname
+        if os.path.exists(self._dir) == False:
+            os.makedirs(self._dir)
+
+    def filename(self, key):
+        return os.path.join(self._dir, key + '.julius')
+
+    def get(self, key):
+        try:
+            f = codecs.open(self.filename(key), 'r', 'utf-8')
+        except IOError:
+            return None
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def put(self, key, data):
+        # write to a temporary file first so that readers never see a partial entry
+        (fd, tmpname) = tempfile.mkstemp(dir=self._dir)
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(data.encode('utf-8'))
+        finally:
+            f.close()
+        try:
+            os.rename(tmpname, self.filename(key))
+        except OSError:
+            # windows does not allow to overwrite by rename
+            os.remove(tmpname)
+
+    def compile(self, srgs, rule=None):
+        key = srgs.cachekey(rule)
+        data = self.get(key)
+        if data is None:
+            data = srgs.toJulius(rule)
+            if data != "":
+                self.put(key, data)
+        return data
+
+    def compileall(self, srgs):
+        # every rule of the grammar as [(rule, data), ...], the rules missing
+        # from the cache are compiled together in one pass
+        keys = {}
+        ret = {}
+        for r in srgs._rules.keys():
+            keys[r] = srgs.cachekey(r)
+            data = self.get(keys[r])
+            if data is not None:
+                ret[r] = data
+        missing = [r for r in srgs._rules.keys() if not ret.has_key(r)]
+        if len(missing) > 0:
+            for (r, data) in srgs.compile_all(missing).items():
+                if data != "":
+                    self.put(keys[r], data)
+                ret[r] = data
+        return [(r, ret[r]) for r in srgs._rules.keys()]
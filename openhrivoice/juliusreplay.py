@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Replay a speech corpus through JuliusWrap
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import sys, os, time, wave, threading, optparse, locale, codecs
+from openhrivoice.__init__ import __version__
+from openhrivoice import utils
+from openhrivoice.parsejuliusmodule import *
+from openhrivoice.juliuswrap import JuliusWrap
+from openhrivoice.latency import monotonic
+from openhrivoice import juliusstub
+try:
+    import gettext
+    _ = gettext.translation(domain='openhrivoice', localedir=os.path.dirname(__file__)+'/../share/locale').ugettext
+except:
+    _ = lambda s: s
+
+__doc__ = _('Replay WAV files through julius (or the stand-in of julius) and report the performance.')
+
+class TimedParser(JuliusModuleParser):
+    """ Module parser which accumulates the time spent in parsing."""
+
+    def __init__(self, encoding='euc_jp'):
+        JuliusModuleParser.__init__(self, encoding)
+        self._cost = 0.0
+        self._messages = 0
+
+    def feed(self, data):
+        t = monotonic()
+        JuliusModuleParser.feed(self, data)
+        self._cost += monotonic() - t
+        self._messages += len(self._events)
+
+class ReplayJuliusWrap(JuliusWrap):
+    """ JuliusWrap which can run the stand-in instead of julius."""
+
+    def __init__(self, language='en', cpu=None, options={}):
+        JuliusWrap.__init__(self, language, cpu, options)
+        self._parser = TimedParser()
+
+    def commandline(self):
+        cmdline = JuliusWrap.commandline(self)
+        if self._options.has_key('stub'):
+            stub = os.path.splitext(juliusstub.__file__)[0] + '.py'
+            cmdline = [sys.executable, stub] + cmdline[1:] + self._options['stub']
+        return cmdline
+
+class ReplayResults:
+    def __init__(self):
+        self._startrec = 0
+        self._results = []
+        self._endrec = None
+        self._latency = []
+        self._answered = None # arrival of the last result
+        self._last = time.time()
+        self._cond = threading.Condition()
+
+    def __call__(self, type, data):
+        if type != JuliusWrap.CB_DOCUMENT:
+            return
+        self._cond.acquire()
+        try:
+            self._last = time.time()
+            if isinstance(data, InputEvent):
+                if data._status == 'STARTREC':
+                    self._startrec += 1
+                elif data._status == 'ENDREC':
+                    self._endrec = data._received
+            elif isinstance(data, RecogoutEvent) and len(data._hypos) > 0 and data._hypos[0]._name == 'SHYPO':
+                self._results.append(" ".join([w._word for w in data._hypos[0]._words if w._word[0:1] != '<']))
+                self._answered = data._received
+                if self._endrec is not None:
+                    self._latency.append(data._received - self._endrec)
+                self._cond.notifyAll()
+            elif isinstance(data, RejectedEvent):
+                self._results.append(None)
+                self._answered = data._received
+                self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
+    def wait(self, timeout, idle=1.0):
+        # wait until every detected utterance has been answered and
+        # julius has been quiet for a while (the audio may still be queued)
+        deadline = time.time() + timeout
+        self._cond.acquire()
+        try:
+            while time.time() < deadline and (len(self._results) < self._startrec or time.time() - self._last < idle):
+                self._cond.wait(0.1)
+        finally:
+            self._cond.release()
+
+def cputime(pid=None):
+    # user and system time of the process (this process by default)
+    if pid is None:
+        t = os.times()
+        return t[0] + t[1]
+    try:
+        f = open('/proc/%i/stat' % (pid,))
+        try:
+            # the fields after the command name (which may contain spaces)
+            s = f.read().rsplit(')', 1)[1].split()
+        finally:
+            f.close()
+        return (int(s[11]) + int(s[12])) / float(os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+
+def readwave(filename):
+    w = wave.open(filename, 'rb')
+    try:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2 or w.getframerate() != 16000:
+            raise ValueError("%s: only 16kHz 16bit mono is supported" % (filename,))
+        return w.readframes(w.getnframes())
+    finally:
+        w.close()
+
+def replay(j, files, speed=1.0, packet=0.032, gap=1.0):
+    # send the files (separated by silence) at speed times real time,
+    # speed 0 sends as fast as possible
+    bytespersec = 16000 * 2
+    size = int(packet * bytespersec) / 2 * 2
+    sent = 0
+    start = monotonic()
+    for f in files:
+        data = readwave(f) + '\0\0' * int(gap * 16000)
+        for i in range(0, len(data), size):
+            if speed > 0:
+                wait = start + float(sent) / bytespersec / speed - monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            j.write(data[i:i+size])
+            sent += len(data[i:i+size])
+    return (float(sent) / bytespersec, monotonic() - start)
+
+def main():
+    encoding = locale.getpreferredencoding()
+    sys.stdout = codecs.getwriter(encoding)(sys.stdout, errors = "replace")
+
+    parser = utils.MyParser(version=__version__, usage="%prog [wavfile...]",
+                            description=__doc__)
+    parser.add_option('-g', '--grammar', dest='grammar', action='store',
+                      default=None,
+                      help=_('W3C-SRGS grammar to be registered'))
+    parser.add_option('-l', '--language', dest='language', action='store',
+                      default='en',
+                      help=_('language of the recognizer when no grammar is given (default: en)'))
+    parser.add_option('-x', '--speed', dest='speed', action='store',
+                      type="float", default=1.0,
+                      help=_('replay speed relative to real time, 0 for as fast as possible (default: 1.0)'))
+    parser.add_option('-s', '--stub', dest='stub', action='store_true',
+                      default=False,
+                      help=_('use the stand-in of julius instead of julius'))
+    parser.add_option('--script', dest='script', action='store',
+                      default=None,
+                      help=_('results to be emitted by the stand-in (one line per utterance)'))
+    parser.add_option('--delay', dest='delay', action='store',
+                      type="float", default=0.0,
+                      help=_('decoding time of the stand-in in seconds per utterance'))
+    parser.add_option('-t', '--transport', dest='transport', action='store',
+                      default='adinnet',
+                      help=_('audio transport to julius: adinnet or pipe (default: adinnet)'))
+    try:
+        opts, args = parser.parse_args()
+    except optparse.OptionError, e:
+        print >>sys.stderr, 'OptionError:', e
+        sys.exit(1)
+    if len(args) == 0:
+        parser.error("wrong number of arguments")
+        sys.exit(1)
+
+    grams = []
+    lang = opts.language
+    if opts.grammar is not None:
+        from openhrivoice.parsesrgs import SRGS
+        from openhrivoice.grammarcache import GrammarCache
+        srgs = SRGS(opts.grammar)
+        lang = srgs._lang
+        grams = GrammarCache().compileall(srgs)
+    options = {'transport': opts.transport}
+    if opts.stub == True:
+        options['stub'] = ['-stubdelay', str(opts.delay)]
+        if opts.script is not None:
+            options['stub'].extend(['-stubscript', opts.script])
+
+    results = ReplayResults()
+    j = ReplayJuliusWrap(lang, None, options)
+    j.setcallback(results)
+    j.start()
+    if j.waitready() == False:
+        print "[error] julius is not responding"
+        j.terminate()
+        sys.exit(1)
+    if len(grams) > 0:
+        j.addgrammars(grams)
+    j.resume()
+    cpu = (cputime(), cputime(j._p.pid))
+    (audiosec, sec) = replay(j, args, opts.speed)
+    while j._sender.counters()['queued'] > 0:
+        time.sleep(0.01)
+    results.wait(10.0 + opts.delay * results._startrec)
+    cpu = (cputime() - cpu[0], (cputime(j._p.pid) or 0) - (cpu[1] or 0))
+    c = j._sender.counters()
+    p = j._parser
+    j.terminate()
+    j.join()
+
+    for r in results._results:
+        if r is None:
+            print "(rejected)"
+        else:
+            print r
+    print "audio: %.1f sec sent in %.2f sec (%.1fx real time)" % (audiosec, sec, audiosec / max(sec, 1e-6))
+    print "cpu (%s): %.1f msec in the wrapper, %.1f msec in julius per second of audio" % (opts.transport, cpu[0] * 1000 / max(audiosec, 1e-6), cpu[1] * 1000 / max(audiosec, 1e-6))
+    print "utterances: %i detected, %i answered" % (results._startrec, len(results._results))
+    if c['packets'] > 0:
+        print "queueing delay: mean %.2f msec, max %.2f msec (%i packets in %i frames, %i bytes dropped)" % (c['delay'] * 1000 / c['packets'], c['maxdelay'] * 1000, c['packets'], c['frames'], c['dropped'])
+    if p._messages > 0:
+        print "parse cost: %.1f usec/message (%i messages)" % (p._cost * 1e6 / p._messages, p._messages)
+    if len(results._latency) > 0:
+        l = sorted(results._latency)
+        print "result latency after ENDREC: median %.1f msec, max %.1f msec" % (l[len(l) / 2] * 1000, l[-1] * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Stand-in for Julius in module mode
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import sys
+import time
+import socket
+import struct
+import audioop
+import codecs
+import threading
+import array
+import os
+
+__doc__ = '''Stand-in for Julius speaking the adinnet and module protocols.
+
+Accepts the command line of julius (only -input, -adport, -module, -smpFreq
+and whether -dfa is given are used) so that it can replace the julius binary
+of JuliusWrap. Speech is segmented with a simple energy threshold and every
+segment is answered with the next result of the script (one line of space
+separated words each, cycled). Options of the stub itself (-h is taken by julius, use --help):
+
+  -stubscript FILE   results to be emitted (default: empty results)
+  -stubdelay SEC     time taken to "decode" each segment (default: 0)
+  -stubthreshold N   rms threshold of speech (default: 300)
+  -stubsilence MSEC  length of silence to end a segment (default: 300)
+'''
+
+class JuliusStub:
+    """ Serve one JuliusWrap with scripted recognition results."""
+
+    def __init__(self, adport, moduleport, rate=16000, script=None,
+                 delay=0.0, threshold=300, silence=300, input='adinnet', startgrammars=0):
+        self._input = input
+        self._adport = adport
+        self._moduleport = moduleport
+        self._rate = rate
+        self._script = script or [[]]
+        self._scriptpos = 0
+        self._delay = delay
+        self._threshold = threshold
+        self._silence = int(rate * silence / 1000.0)
+        self._grammars = {} # name: (dfa, dict, active)
+        self._gramorder = []
+        # grammar ids are given by a counter of each recognition process
+        # like julius does: the grammars of the command line come first
+        # and CHANGEGRAM does not reset it
+        self._startgrammars = startgrammars
+        self._gramids = {} # name: id
+        self._nextid = startgrammars
+        self._current = None # recognition process (multi-instance mode)
+        self._processes = {} # name: (grammars, gramorder, gramids, nextid)
+        self._active = True
+        self._speech = False
+        self._pos = 0 # samples received
+        self._window = rate / 100 * 2 # bytes of the 10 msec detection window
+        self._carry = '' # samples short of a whole window
+        self._start = 0
+        self._silent = 0
+        self._lock = threading.Lock()
+        self._modulesocket = None
+
+    def listen(self, port):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(('localhost', port))
+        s.listen(1)
+        return s
+
+    def serve(self):
+        ms = self.listen(self._moduleport)
+        if self._input == 'stdin':
+            t = threading.Thread(target=self.servestdin)
+        else:
+            ads = self.listen(self._adport)
+            t = threading.Thread(target=self.serveaudio, args=(ads,))
+        (self._modulesocket, addr) = ms.accept()
+        ms.close()
+        t.setDaemon(True)
+        t.start()
+        self.servemodule()
+
+    def send(self, msg):
+        self._lock.acquire()
+        try:
+            self._modulesocket.sendall(msg.encode('euc_jp', 'replace') + "\n.\n")
+        except socket.error:
+            pass
+        finally:
+            self._lock.release()
+
+    def sendinput(self, status):
+        self.send(u'<INPUT STATUS="%s" TIME="%i"/>' % (status, int(time.time())))
+
+    def readline(self, f):
+        l = f.readline()
+        if l == '':
+            raise EOFError
+        return l.rstrip('\r\n')
+
+    def servemodule(self):
+        f = self._modulesocket.makefile('rb')
+        try:
+            while True:
+                self.command(f, self.readline(f))
+        except (EOFError, socket.error):
+            pass
+
+    def command(self, f, line):
+        args = line.split()
+        if len(args) == 0:
+            return
+        cmd = args[0]
+        if cmd == 'STATUS':
+            if self._active:
+                self.send(u'<SYSINFO PROCESS="ACTIVE"/>')
+            else:
+                self.send(u'<SYSINFO PROCESS="SLEEP"/>')
+        elif cmd in ('CHANGEGRAM', 'ADDGRAM'):
+            name = args[1]
+            dfa = []
+            dic = []
+            l = self.readline(f)
+            while l != 'DFAEND':
+                dfa.append(l)
+                l = self.readline(f)
+            l = self.readline(f)
+            while l != 'DICEND':
+                dic.append(l)
+                l = self.readline(f)
+            if cmd == 'CHANGEGRAM':
+                self._grammars = {}
+                self._gramorder = []
+                self._gramids = {}
+            self._grammars[name] = (dfa, dic, True)
+            self._gramorder.append(name)
+            self._gramids[name] = self._nextid
+            self._nextid += 1
+            self.send(u'<GRAMMAR STATUS="RECEIVED"/>')
+        elif cmd in ('ACTIVATEGRAM', 'DEACTIVATEGRAM', 'DELGRAM'):
+            name = self.readline(f).strip()
+            if not self._grammars.has_key(name):
+                self.send(u'<GRAMMAR STATUS="ERROR" REASON="NOT FOUND"/>')
+                return
+            (dfa, dic, active) = self._grammars[name]
+            if cmd == 'DELGRAM':
+                del self._grammars[name]
+                del self._gramids[name]
+                self._gramorder.remove(name)
+            else:
+                self._grammars[name] = (dfa, dic, cmd == 'ACTIVATEGRAM')
+            self.send(u'<GRAMMAR STATUS="RECEIVED"/>')
+        elif cmd == 'ADDWORD':
+            gid = self.readline(f).strip()
+            words = []
+            l = self.readline(f)
+            while l != 'DICEND':
+                words.append(l)
+                l = self.readline(f)
+            names = [n for (n, i) in self._gramids.items() if str(i) == gid]
+            if len(names) == 0:
+                self.send(u'<GRAMMAR STATUS="ERROR" REASON="NOT FOUND"/>')
+                return
+            name = names[0]
+            (dfa, dic, active) = self._grammars[name]
+            self._grammars[name] = (dfa, dic + words, active)
+            self.send(u'<GRAMMAR STATUS="RECEIVED"/>')
+        elif cmd == 'CURRENTPROCESS':
+            self._processes[self._current] = (self._grammars, self._gramorder, self._gramids, self._nextid)
+            self._current = args[1]
+            (self._grammars, self._gramorder, self._gramids, self._nextid) = \
+                self._processes.get(self._current, ({}, [], {}, self._startgrammars))
+        elif cmd == 'SYNCGRAM':
+            self.send(u'<GRAMMAR STATUS="READY"/>')
+        elif cmd in ('TERMINATE', 'PAUSE'):
+            self._active = False
+            self._speech = False
+        elif cmd == 'RESUME':
+            self._active = True
+            self.sendinput(u'LISTEN')
+        elif cmd == 'DIE':
+            raise EOFError
+
+    def recvall(self, s, size):
+        buf = ''
+        while len(buf) < size:
+            d = s.recv(size - len(buf))
+            if d == '':
+                raise EOFError
+            buf += d
+        return buf
+
+    def serveaudio(self, ads):
+        (s, addr) = ads.accept()
+        ads.close()
+        try:
+            while True:
+                size = struct.unpack("i", self.recvall(s, 4))[0]
+                if size <= 0:
+                    # end of segment
+                    if self._speech:
+                        self.endsegment()
+                    continue
+                self.onaudio(self.recvall(s, size))
+        except (EOFError, socket.error):
+            pass
+
+    def servestdin(self):
+        # raw big endian samples until the end of the input
+        remain = ''
+        while True:
+            data = os.read(0, 8192)
+            if data == '':
+                break
+            data = remain + data
+            n = len(data) / 2 * 2
+            remain = data[n:]
+            a = array.array('h', data[:n])
+            if sys.byteorder == 'little':
+                a.byteswap()
+            self.onaudio(a.tostring())
+
+    def onaudio(self, data):
+        if not self._active:
+            return
+        # the senders coalesce the packets, so the level is taken over
+        # fixed windows rather than over whatever arrived at once
+        data = self._carry + data
+        w = self._window
+        end = len(data) / w * w
+        self._carry = data[end:]
+        n = w / 2
+        for i in range(0, end, w):
+            voiced = audioop.rms(data[i:i + w], 2) > self._threshold
+            self._pos += n
+            if not self._speech:
+                if voiced:
+                    self._speech = True
+                    self._start = self._pos - n
+                    self._silent = 0
+                    self.sendinput(u'STARTREC')
+            elif voiced:
+                self._silent = 0
+            else:
+                self._silent += n
+                if self._silent >= self._silence:
+                    self.endsegment()
+
+    def endsegment(self):
+        self._speech = False
+        self.sendinput(u'ENDREC')
+        samples = self._pos - self._start
+        self.send(u'<INPUTPARAM FRAMES="%i" MSEC="%i"/>' % (samples / (self._rate / 100), samples * 1000 / self._rate))
+        if self._delay > 0:
+            time.sleep(self._delay)
+        words = self._script[self._scriptpos % len(self._script)]
+        self._scriptpos += 1
+        gram = 0
+        for name in self._gramorder:
+            if self._grammars[name][2]:
+                gram = self._gramids[name]
+                break
+        msg = [u'<RECOGOUT>', u'  <SHYPO RANK="1" SCORE="-%.1f" GRAM="%i">' % (samples / 10.0, gram)]
+        for w in [u'<s>'] + words + [u'</s>']:
+            msg.append(u'    <WHYPO WORD="%s" CLASSID="0" PHONE="" CM="1.000"/>' % (w,))
+        msg.extend([u'  </SHYPO>', u'</RECOGOUT>'])
+        self.send(u'\n'.join(msg))
+        self.sendinput(u'LISTEN')
+
+def readscript(filename):
+    f = codecs.open(filename, 'r', 'utf-8')
+    try:
+        return [l.split() for l in f if l.strip() != '']
+    finally:
+        f.close()
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    opts = {'-input': 'adinnet', '-adport': 5530, '-module': 10500, '-smpFreq': 16000,
+            '-stubscript': None, '-stubdelay': 0.0, '-stubthreshold': 300, '-stubsilence': 300}
+    i = 0
+    while i < len(argv):
+        if opts.has_key(argv[i]) and i + 1 < len(argv):
+            opts[argv[i]] = argv[i + 1]
+            i += 1
+        elif argv[i] == '--help':
+            print __doc__
+            return 0
+        i += 1
+    script = None
+    if opts['-stubscript'] is not None:
+        script = readscript(opts['-stubscript'])
+    startgrammars = 0
+    if '-dfa' in argv:
+        startgrammars = 1
+    stub = JuliusStub(int(opts['-adport']), int(opts['-module']), int(opts['-smpFreq']),
+                      script, float(opts['-stubdelay']), int(opts['-stubthreshold']), int(opts['-stubsilence']),
+                      opts['-input'], startgrammars)
+    stub.serve()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
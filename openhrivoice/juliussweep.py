@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Sweep the search parameters of julius over a labelled corpus
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import sys, os, time, optparse, locale, codecs
+from openhrivoice.__init__ import __version__
+from openhrivoice import utils
+from openhrivoice.latency import monotonic
+from openhrivoice.juliusreplay import ReplayJuliusWrap, ReplayResults, readwave, replay
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import gettext
+    _ = gettext.translation(domain='openhrivoice', localedir=os.path.dirname(__file__)+'/../share/locale').ugettext
+except:
+    _ = lambda s: s
+
+__doc__ = _('Replay a labelled corpus through julius for every combination of the search parameters and report the real time factor, the memory and the sentence accuracy.')
+
+# option name: (name of the engine option, julius option)
+PARAMETERS = (('beam', '-b'), ('beam2', '-b2'), ('stack', '-s'), ('overflow', '-m'), ('nbest', '-n'))
+
+def readcorpus(filename):
+    """ Read the corpus list: one "wavfile transcript" per line, the paths
+    are relative to the list."""
+    base = os.path.dirname(os.path.abspath(filename))
+    corpus = []
+    f = codecs.open(filename, 'r', 'utf-8')
+    try:
+        for l in f:
+            l = l.strip()
+            if l == '' or l[0] == '#':
+                continue
+            w = l.split()
+            corpus.append((os.path.join(base, w[0]), u" ".join(w[1:])))
+    finally:
+        f.close()
+    return corpus
+
+def grid(values):
+    """ Every combination of the parameter values.
+
+    >>> grid([('beam', [400, 800]), ('nbest', [1])])
+    [{'beam': 400, 'nbest': 1}, {'beam': 800, 'nbest': 1}]
+    """
+    ret = [{}]
+    for (name, vals) in values:
+        ret = [dict(r.items() + [(name, v)]) for r in ret for v in vals]
+    return ret
+
+def peakmemory(pid):
+    # peak resident set size of the process in bytes
+    try:
+        f = open('/proc/%i/status' % (pid,))
+        try:
+            for l in f:
+                if l.startswith('VmHWM:'):
+                    return int(l.split()[1]) * 1024
+        finally:
+            f.close()
+    except IOError:
+        pass
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except (AttributeError, psutil.Error):
+            pass
+    return None
+
+def run(corpus, options, grams, lang, timeout=10.0, gap=1.0):
+    """ Decode the corpus one file at a time with the given engine options
+    and return (real time factor, peak memory, sentence accuracy, results)."""
+    results = ReplayResults()
+    j = ReplayJuliusWrap(lang, None, options)
+    j.setcallback(results)
+    j.start()
+    try:
+        if j.waitready() == False:
+            raise RuntimeError("julius is not responding")
+        if len(grams) > 0:
+            j.addgrammars(grams)
+        j.resume()
+        audiosec = 0.0
+        decodesec = 0.0
+        correct = 0
+        hyps = []
+        for (wav, label) in corpus:
+            n = len(results._results)
+            start = monotonic()
+            (sec, dt) = replay(j, [wav], 0, gap=gap)
+            while j._sender.counters()['queued'] > 0:
+                time.sleep(0.005)
+            results.wait(timeout, idle=0.2)
+            # time from the first packet to the answer of the file
+            if len(results._results) > n and results._answered is not None:
+                decodesec += results._answered - start
+            else:
+                decodesec += monotonic() - start
+            audiosec += sec
+            hyp = None
+            if len(results._results) > n:
+                hyp = results._results[-1]
+            hyps.append(hyp)
+            if hyp is not None and hyp.split() == label.split():
+                correct += 1
+        memory = None
+        if j._p is not None:
+            memory = peakmemory(j._p.pid)
+    finally:
+        j.terminate()
+        j.join()
+    return (decodesec / max(audiosec, 1e-6), memory, float(correct) / max(len(corpus), 1), hyps)
+
+def main():
+    encoding = locale.getpreferredencoding()
+    sys.stdout = codecs.getwriter(encoding)(sys.stdout, errors = "replace")
+
+    parser = utils.MyParser(version=__version__, usage="%prog [options] corpuslist",
+                            description=__doc__)
+    parser.add_option('-g', '--grammar', dest='grammar', action='store',
+                      default=None,
+                      help=_('W3C-SRGS grammar to be registered'))
+    parser.add_option('-l', '--language', dest='language', action='store',
+                      default='en',
+                      help=_('language of the recognizer when no grammar is given (default: en)'))
+    parser.add_option('-b', '--beam', dest='beam', action='store',
+                      default='400,800,1200',
+                      help=_('beam widths of the first pass (default: 400,800,1200)'))
+    parser.add_option('-B', '--beam2', dest='beam2', action='store',
+                      default='80,120',
+                      help=_('beam widths of the second pass (default: 80,120)'))
+    parser.add_option('-S', '--stack', dest='stack', action='store',
+                      default='1000',
+                      help=_('stack sizes of the second pass (default: 1000)'))
+    parser.add_option('-m', '--overflow', dest='overflow', action='store',
+                      default='2000',
+                      help=_('hypotheses overflow thresholds of the second pass (default: 2000)'))
+    parser.add_option('-n', '--nbest', dest='nbest', action='store',
+                      default='5',
+                      help=_('numbers of sentence candidates (default: 5)'))
+    parser.add_option('-t', '--target', dest='target', action='store',
+                      type="float", default=None,
+                      help=_('recommend the fastest setting reaching this sentence accuracy (0-1)'))
+    parser.add_option('-s', '--stub', dest='stub', action='store_true',
+                      default=False,
+                      help=_('use the stand-in of julius instead of julius'))
+    parser.add_option('--script', dest='script', action='store',
+                      default=None,
+                      help=_('results to be emitted by the stand-in (one line per utterance)'))
+    parser.add_option('-v', '--verbose', dest='verbose', action='store_true',
+                      default=False,
+                      help=_('print the result of every file'))
+    try:
+        opts, args = parser.parse_args()
+    except optparse.OptionError, e:
+        print >>sys.stderr, 'OptionError:', e
+        sys.exit(1)
+    if len(args) != 1:
+        parser.error("wrong number of arguments")
+        sys.exit(1)
+
+    corpus = readcorpus(args[0])
+    for (wav, label) in corpus:
+        readwave(wav) # check the format before starting
+    grams = []
+    lang = opts.language
+    if opts.grammar is not None:
+        from openhrivoice.parsesrgs import SRGS
+        from openhrivoice.grammarcache import GrammarCache
+        srgs = SRGS(opts.grammar)
+        lang = srgs._lang
+        grams = GrammarCache().compileall(srgs)
+    values = []
+    for (name, opt) in PARAMETERS:
+        try:
+            values.append((name, [int(v) for v in getattr(opts, name).split(',')]))
+        except ValueError:
+            parser.error("invalid value of %s: %s" % (name, getattr(opts, name)))
+
+    print "%6s %6s %6s %6s %4s %8s %8s %8s" % ('beam', 'beam2', 'stack', 'ovfl', 'n', 'RTF', 'MB', 'accuracy')
+    rows = []
+    for search in grid(values):
+        options = dict(search)
+        if opts.stub == True:
+            options['stub'] = []
+            if opts.script is not None:
+                options['stub'].extend(['-stubscript', opts.script])
+        try:
+            (rtf, memory, accuracy, hyps) = run(corpus, options, grams, lang)
+        except RuntimeError, e:
+            print "[error]", e
+            sys.exit(1)
+        if memory is None:
+            mb = "-"
+        else:
+            mb = "%.1f" % (memory / 1048576.0,)
+        print "%6i %6i %6i %6i %4i %8.3f %8s %8.3f" % (search['beam'], search['beam2'], search['stack'],
+                                                       search['overflow'], search['nbest'], rtf, mb, accuracy)
+        if opts.verbose:
+            for ((wav, label), hyp) in zip(corpus, hyps):
+                print "  %s: %s" % (os.path.basename(wav), hyp)
+        rows.append((rtf, accuracy, search))
+
+    if opts.target is not None:
+        ok = [r for r in rows if r[1] >= opts.target]
+        if len(ok) == 0:
+            print "no setting reaches the sentence accuracy of %.3f" % (opts.target,)
+        else:
+            (rtf, accuracy, search) = min(ok)
+            print "fastest setting reaching %.3f: %s (RTF %.3f, accuracy %.3f)" % \
+                (opts.target, " ".join(["%s %i" % (opt, search[name]) for (name, opt) in PARAMETERS]), rtf, accuracy)
+
+if __name__ == '__main__':
+    main()
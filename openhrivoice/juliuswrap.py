@@ -0,0 +1,814 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Julius process wrapper
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import os, socket, subprocess, threading, platform
+import time, struct, select, Queue, array, sys
+from openhrivoice.parsejuliusmodule import *
+from openhrivoice.audiosender import AudioSender
+from openhrivoice.utterancecapture import UtteranceCapture
+from openhrivoice.latency import monotonic
+from openhrivoice.config import config
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+class GrammarState:
+    """ Grammars registered to one recognition process of julius."""
+
+    def __init__(self):
+        self._grammars = {} # name: grammar id given by julius
+        self._firstgrammar = True
+        self._activegrammars = {}
+        self._grammardata = [] # (name, data) in the order of registration
+
+class JuliusWrap(threading.Thread):
+    CB_DOCUMENT = 1
+    CB_LOGWAVE = 2
+
+    # sections of the options in the multi-instance mode (the rest is global)
+    AMOPTIONS = ('-h', '-hlist', '-spmodel', '-iwcd1', '-gprune', '-smpFreq')
+    LMOPTIONS = ('-d', '-dfa', '-v', '-forcedict')
+    SROPTIONS = ('-sb', '-b', '-b2', '-s', '-m', '-n', '-output', '-progout', '-proginterval',
+                 '-penalty1', '-penalty2')
+    # recognizer options taken from the options of each instance
+    INSTANCEOPTIONS = ('-b', '-b2', '-s', '-m', '-n', '-output', '-progout', '-proginterval')
+    # adinnet  -- audio over a TCP connection (julius may be remote in future)
+    # pipe     -- audio through the standard input of julius (-input stdin)
+    TRANSPORTS = ('adinnet', 'pipe')
+    
+    def __init__(self, language='jp', cpu=None, options={}):
+        threading.Thread.__init__(self)
+        self._config = config()
+        self._running = False
+        self._platform = platform.system()
+        self._ready = threading.Event()
+        self._acks = Queue.Queue()
+        self._cmdlock = threading.Lock()
+        self._lang = language
+        self._options = options
+        self._transport = options.get('transport', 'adinnet')
+        if self._transport not in self.TRANSPORTS:
+            print "[error] unknown audio transport: %s" % (self._transport,)
+            self._transport = 'adinnet'
+        self._memsize = "large"
+        #self._memsize = "medium"
+        self._callbacks = [] # (func, instance)
+        # grammars of each recognition process (None in the single instance mode)
+        self._instances = options.get('instances')
+        # options of each instance overriding the common ones (search and
+        # interim results)
+        self._instanceoptions = dict(options.get('instanceoptions', {}))
+        self._states = {}
+        for i in (self._instances or [None,]):
+            self._states[i] = GrammarState()
+        self._running_instances = set(self._states.keys())
+        self._gramids = {} # next grammar id of each recognition process
+        self._users = set() # names of the JuliusInstance objects sharing this julius
+        self._feeder = None # name of the instance feeding the audio
+        self._paused = False
+        self._cpu = cpu
+        # supervision
+        self._stopped = threading.Event()
+        self._restarts = 0
+        self._downtime = 0.0
+        self._downsince = None
+        self._restartwait = 0.5
+        self._restartmaxwait = 30.0
+        self._parser = JuliusModuleParser()
+        self._capture = UtteranceCapture(rate=16000)
+        self._running = True
+        self._sender = AudioSender(self.sendaudio)
+        self.spawn()
+        self._sender.start()
+        print "JuliusWrap started"
+
+    def spawn(self):
+        # start julius and connect to its ports
+        self._ready.clear()
+        self._parser.reset()
+        self._modulesocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._audiosocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._audiopipe = None
+        self._audioconnected = False
+        self._audioport = None
+        if self._transport == 'adinnet':
+            self._audioport = self.getunusedport()
+        self._moduleport = self.getunusedport()
+        self._cmdline = self.commandline()
+        print "command line: %s" % " ".join(self._cmdline)
+        # julius numbers the grammars of a recognition process with a counter
+        # running from the grammar given on the command line (not reset by
+        # CHANGEGRAM)
+        startup = 0
+        if '-dfa' in self._cmdline:
+            startup = 1
+        for i in self._states.keys():
+            self._gramids[i] = startup
+        stdin = None
+        if self._transport == 'pipe':
+            stdin = subprocess.PIPE
+        try:
+            self._p = subprocess.Popen(self._cmdline, stdin=stdin)
+        except OSError, e:
+            print "[error] unable to start julius: %s" % (str(e),)
+            self._p = None
+            return False
+        self.setaffinity(self._cpu)
+        print "connecting to ports"
+        if self.retryconnect(self.connectmodule) == False or self.retryconnect(self.connectaudio) == False:
+            return False
+        return self.send("INPUTONCHANGE TERMINATE\n")
+
+    def kill(self):
+        # close the connections and stop julius
+        for s in (self._audiosocket, self._modulesocket):
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            s.close()
+        if self._audiopipe is not None:
+            try:
+                self._audiopipe.close()
+            except IOError:
+                pass
+            self._audiopipe = None
+        self._audioconnected = False
+        if self._p is not None and self._p.poll() is None:
+            try:
+                self._p.terminate()
+                self._p.wait()
+            except OSError:
+                pass
+
+    def commandline(self):
+        cmdline = []
+        cmdline.append(self._config._julius_bin)
+        if self._lang in ('ja', 'jp'):
+            cmdline.extend(['-h',  self._config._julius_hmm_ja])
+            cmdline.extend(['-hlist', self._config._julius_hlist_ja])
+            if self._options.get('profile') == 'dictation':
+                cmdline.extend(['-d',  self._config._julius_ngram_ja])
+                cmdline.extend(['-v', self._config._julius_dict_ja])
+            else:
+                # grammar only: the N-gram is not loaded
+                cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy.dfa")])
+                cmdline.extend(["-v" , os.path.join(self._config._basedir, "dummy.dict")])
+            cmdline.extend(["-sb", "80.0"])
+        elif self._lang == 'de':
+            cmdline.extend(['-h',  self._config._julius_hmm_de])
+            cmdline.extend(['-hlist', self._config._julius_hlist_de])
+            cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy-en.dfa")])
+            cmdline.extend(["-v", os.path.join(self._config._basedir, "dummy-en.dict")])
+            cmdline.extend(["-sb", "160.0"])
+        #for chinese test
+        elif self._lang == 'cn':
+            cmdline.extend(['-h',  self._config._julius_hmm_cn])
+            cmdline.extend(['-hlist', self._config._julius_hlist_cn])
+            cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy-en.dfa")])
+            cmdline.extend(["-v", os.path.join(self._config._basedir, "test-cn.dict")])
+            cmdline.extend(["-sb", "160.0"])
+        else:
+            cmdline.extend(['-h',  self._config._julius_hmm_en])
+            cmdline.extend(['-hlist', self._config._julius_hlist_en])
+            cmdline.extend(["-dfa", os.path.join(self._config._basedir, "dummy-en.dfa")])
+            cmdline.extend(["-v", os.path.join(self._config._basedir, "dummy-en.dict")])
+            cmdline.extend(["-sb", "160.0"])
+        cmdline.extend(self.inputoptions())
+        cmdline.extend(["-module", str(self._moduleport)])
+        cmdline.extend(self.recognizeroptions())
+        cmdline.extend(["-pausesegment", "-rejectshort", "200"])
+        cmdline.extend(["-nostrip"])
+        #cmdline.extend(["-multipath"])
+        #wu#cmdline.extend(["-multipath"]) #wu# for ver4.2 
+        #wu#cmdline.extend(["-spmodel", "sp", "-iwsp", "-iwsppenalty", "-70.0"])
+        cmdline.extend(["-spmodel", "sp"])
+        cmdline.extend(["-penalty1", "5.0", "-penalty2", "20.0", "-iwcd1", "max", "-gprune", "safe"])
+        cmdline.extend(["-smpFreq", "16000"])
+        cmdline.extend(["-forcedict"])
+        #cmdline.extend(["-nolog"])
+        if self._instances is not None:
+            cmdline = self.multiinstance(cmdline, self._instances)
+        return cmdline
+
+    def inputoptions(self):
+        if self._transport == 'pipe':
+            return ["-input", "stdin"]
+        return ["-input", "adinnet",  "-adport",  str(self._audioport)]
+
+    def option(self, name, instance=None):
+        # option of the instance or the common one
+        return self._instanceoptions.get(instance, {}).get(name, self._options.get(name))
+
+    def recognizeroptions(self, instance=None):
+        search = self.searchoptions(instance)
+        ret = ["-b", str(search['beam']), "-b2", str(search['beam2']),
+               "-s", str(search['stack']), "-m", str(search['overflow']),
+               "-n", str(search['nbest']), "-output", str(search['nbest'])]
+        if self.option('proginterval', instance) is not None:
+            # output interim results of the first pass
+            ret.extend(["-progout", "-proginterval", str(self.option('proginterval', instance))])
+        return ret
+
+    def searchoptions(self, instance=None):
+        # beam width of the 1st (-b) and the 2nd (-b2) pass, stack size (-s),
+        # hypotheses overflow (-m) and N-best (-n) overridden by the options
+        if self._memsize == "large":
+            #wu#cmdline.extend(["-b", "-1", "-b2", "120", "-s", "1000" ,"-m", "2000"])
+            search = {'beam': 800, 'beam2': 120, 'stack': 1000, 'overflow': 2000}
+        else:
+            #wu#cmdline.extend(["-b", "-1", "-b2", "80", "-s", "500" ,"-m", "1000"])
+            search = {'beam': 800, 'beam2': 80, 'stack': 500, 'overflow': 1000}
+        search['nbest'] = 5
+        for k in search.keys():
+            if self.option(k, instance) is not None:
+                search[k] = self.option(k, instance)
+        return search
+
+    def multiinstance(self, cmdline, instances):
+        # regroup the options so that every instance has its own grammars
+        # (-LM) and recognizer (-SR) sharing one acoustic model (-AM)
+        (common, am, lm, sr) = ([], [], [], [])
+        i = 1
+        while i < len(cmdline):
+            opt = [cmdline[i]]
+            i += 1
+            while i < len(cmdline) and (not cmdline[i].startswith('-') or isnumber(cmdline[i])):
+                opt.append(cmdline[i])
+                i += 1
+            if opt[0] in self.AMOPTIONS:
+                am.extend(opt)
+            elif opt[0] in self.LMOPTIONS:
+                lm.extend(opt)
+            elif opt[0] in self.INSTANCEOPTIONS:
+                pass # given for each instance
+            elif opt[0] in self.SROPTIONS:
+                sr.extend(opt)
+            else:
+                common.extend(opt)
+        ret = [cmdline[0]] + common + ['-AM', 'am'] + am
+        for name in instances:
+            ret.extend(['-LM', name] + lm + ['-SR', name, 'am', name] + sr + self.recognizeroptions(name))
+        return ret
+
+    def reconfigure(self, options, instance=None):
+        # apply new options of an instance: julius is restarted (and the
+        # grammars restored) when its command line changes
+        if options.get('transport', self._transport) != self._transport:
+            print "[error] the audio transport of a running julius cannot be changed"
+            return False
+        old = self.commandline()
+        self._instanceoptions[instance] = dict(options)
+        if self.commandline() != old:
+            print "restarting julius to apply the options of %s" % (instance,)
+            self.restart()
+        return True
+
+    def restart(self):
+        # julius is started again by the event loop
+        if self._p is not None and self._p.poll() is None:
+            try:
+                self._p.terminate()
+            except OSError:
+                pass
+
+    def setaffinity(self, cpu):
+        # pin the process to a cpu core (needs psutil)
+        if cpu is None or psutil is None:
+            return
+        try:
+            psutil.Process(self._p.pid).cpu_affinity([cpu,])
+        except (AttributeError, psutil.Error):
+            print "[warning] unable to set cpu affinity of julius"
+
+    def getunusedport(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('localhost', 0))
+        addr, port = s.getsockname()
+        s.close()
+        return port
+
+    def retryconnect(self, func, timeout=60.0):
+        # Julius opens its ports only after loading the models
+        wait = 0.01
+        deadline = time.time() + timeout
+        while func() == False:
+            if self._running == False or self._p.poll() is not None or time.time() > deadline:
+                print "[error] unable to connect to julius"
+                return False
+            time.sleep(wait)
+            wait = min(wait * 2, 0.5)
+        return True
+
+    def connectmodule(self):
+        try:
+            self._modulesocket.connect(("localhost", self._moduleport))
+        except socket.error:
+            self._modulesocket.close()
+            self._modulesocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            return False
+        return True
+
+    def connectaudio(self):
+        if self._transport == 'pipe':
+            # the pipe is ready as soon as julius has started
+            self._audiopipe = self._p.stdin
+            self._audioconnected = True
+            return True
+        if self._audioconnected == False:
+            try:
+                self._audiosocket.connect(("localhost", self._audioport))
+            except socket.error:
+                # a socket object cannot be connected twice
+                self._audiosocket.close()
+                self._audiosocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                return False
+            self._audioconnected = True
+        return True
+
+    def waitready(self, timeout=10.0):
+        # handshake: julius answers STATUS with <SYSINFO PROCESS="..."/>
+        self._ready.clear()
+        if self.send("STATUS\n") == False:
+            return False
+        self._ready.wait(timeout)
+        return self._ready.isSet()
+
+    def send(self, data):
+        # send to the module port (julius may be down while restarting)
+        try:
+            self._modulesocket.sendall(data)
+        except socket.error:
+            return False
+        return True
+
+    def pause(self, instance=None):
+        # stop recognition at once, discarding the current input (in the
+        # multi-instance mode julius keeps running until every instance is
+        # paused, the results of the paused ones are not delivered)
+        if instance is None:
+            self._running_instances.clear()
+        else:
+            self._running_instances.discard(instance)
+        if len(self._running_instances) > 0:
+            return
+        self._paused = True
+        self.send("TERMINATE\n")
+
+    def resume(self, instance=None):
+        if instance is None:
+            self._running_instances.update(self._states.keys())
+        else:
+            self._running_instances.add(instance)
+        self._paused = False
+        self.send("RESUME\n")
+
+    def terminate(self):
+        print 'JuliusWrap: terminate'
+        self._running = False
+        self._stopped.set()
+        self._sender.terminate()
+        # shutdown wakes up the event loop blocking on select
+        self.kill()
+        return 0
+
+    def write(self, data, t=None):
+        # queued to the sender thread so that the inport is never blocked
+        return self._sender.write(data, t)
+
+    def sendaudio(self, data, t):
+        # one adinnet frame (length + samples) or one write to the pipe per
+        # call, the audio is discarded while julius is down
+        if self._audioconnected == False:
+            return
+        try:
+            if self._audiopipe is not None:
+                self._audiopipe.write(tobigendian(data))
+            else:
+                self._audiosocket.sendall(struct.pack("i", len(data)) + data)
+        except (socket.error, IOError, ValueError):
+            self._audioconnected = False
+            return
+        self._capture.append(data, t)
+
+    def setoverloadpolicy(self, policy):
+        self._sender.setpolicy(policy)
+
+    def run(self):
+        while self._running:
+            self.eventloop()
+            if self._running:
+                self.recover()
+        print 'JuliusWrap: exit from event loop'
+
+    def eventloop(self):
+        # returns when the connection to julius is lost
+        while self._running:
+            if self._p is None or self._audioconnected == False:
+                print 'not connected to julius'
+                return
+            try:
+                readable = select.select([self._modulesocket] + self.audiosockets(), [], [], 1.0)[0]
+            except (select.error, socket.error):
+                if self._running:
+                    print 'socket error'
+                return
+            if not self._running:
+                return
+            if self._p.poll() is not None:
+                print 'julius exited (%i)' % (self._p.returncode,)
+                return
+            if self._audiosocket in readable:
+                try:
+                    data = self._audiosocket.recv(1024)
+                except socket.error:
+                    data = ''
+                if data == '':
+                    print 'audio socket closed'
+                    self._audioconnected = False
+                    return
+            if self._modulesocket in readable:
+                try:
+                    data = self._modulesocket.recv(1024*10)
+                except socket.error:
+                    print 'socket error'
+                    return
+                if data == '':
+                    print 'socket closed'
+                    return
+                self.onmoduledata(data)
+
+    def audiosockets(self):
+        # adinnet connection watched for the close by julius
+        if self._audiopipe is not None:
+            return []
+        return [self._audiosocket]
+
+    def recover(self):
+        # restart julius with exponential backoff
+        if self._downsince is None:
+            self._downsince = time.time()
+        print "[error] lost julius, restarting"
+        wait = self._restartwait
+        while self._running:
+            self.kill()
+            self._restarts += 1
+            if self.spawn():
+                break
+            self._stopped.wait(wait)
+            wait = min(wait * 2, self._restartmaxwait)
+        if not self._running:
+            return
+        # the grammars are restored while the event loop is running
+        t = threading.Thread(target=self.restore)
+        t.setDaemon(True)
+        t.start()
+
+    def restore(self):
+        # register and activate the grammars again and restore the pause state
+        if self.waitready() == False or self.restoregrammars() == False:
+            print "[error] unable to restore julius"
+            if self._p is not None and self._p.poll() is None:
+                self._p.terminate() # restarted again by the event loop
+            return
+        if self._paused:
+            self.send("TERMINATE\n")
+        else:
+            self.send("RESUME\n")
+        self._downtime += time.time() - self._downsince
+        self._downsince = None
+        print "julius restarted"
+
+    def restoregrammars(self):
+        for (instance, old) in self._states.items():
+            if self.reloadgrammars(old._grammardata, old._activegrammars.keys(), instance) == False:
+                return False
+        return True
+
+    def reloadgrammars(self, grams, active, instance=None):
+        # register the grammars from scratch and activate the given ones
+        self._states[instance] = GrammarState()
+        if len(grams) == 0:
+            return True
+        if self.addgrammars(grams, instance) == False:
+            return False
+        return self.setactivegrammars(active, instance) is not None
+
+    def health(self):
+        # restart count and total downtime (in seconds) of julius
+        downtime = self._downtime
+        if self._downsince is not None:
+            downtime += time.time() - self._downsince
+        return {'restarts': self._restarts, 'downtime': downtime,
+                'alive': self._downsince is None}
+
+    def onmoduledata(self, data):
+        now = monotonic()
+        self._parser.feed(data)
+        for e in self._parser.events():
+            e._received = now
+            if e._name == 'SYSINFO':
+                self._ready.set()
+            elif e._name == 'GRAMMAR':
+                self._acks.put(e)
+            # results of the multi-instance mode are tagged with the instance
+            instance = e.get('NAME')
+            for (c, i) in self._callbacks:
+                if i is not None and i not in self._running_instances:
+                    continue # paused instance
+                if instance is None or i is None or instance == i:
+                    c(self.CB_DOCUMENT, e)
+            self.captureutterance(e)
+
+    def captureutterance(self, e):
+        # cut the utterance out of the audio sent so far
+        utt = None
+        if isinstance(e, InputEvent):
+            if e._status == 'STARTREC':
+                self._capture.startrec()
+            elif e._status == 'ENDREC':
+                self._capture.endrec()
+        elif e._name == 'INPUTPARAM':
+            try:
+                utt = self._capture.cut(float(e.get('MSEC')))
+            except (TypeError, ValueError):
+                utt = self._capture.cut()
+        elif e._name in ('RECOGOUT', 'REJECTED', 'RECOGFAIL'):
+            utt = self._capture.cut()
+        if utt is not None:
+            for (c, i) in self._callbacks:
+                if i is not None and i not in self._running_instances:
+                    continue
+                c(self.CB_LOGWAVE, utt)
+
+    def command(self, cmds, timeout=5.0):
+        # send all the commands at once and then collect one
+        # <GRAMMAR STATUS="..."/> acknowledgement per command
+        self._cmdlock.acquire()
+        try:
+            while not self._acks.empty():
+                self._acks.get_nowait() # late acknowledgement of a timed out command
+            if self.send("".join(cmds)) == False:
+                print "[error] julius is not connected: %s" % (cmds[0].split('\n')[0],)
+                return False
+            ret = True
+            for c in cmds:
+                try:
+                    e = self._acks.get(True, timeout)
+                except Queue.Empty:
+                    print "[error] no acknowledgement from julius: %s" % (c.split('\n')[0],)
+                    return False
+                if e.get('STATUS') == 'ERROR':
+                    print "[error] julius rejected the command: %s (%s)" % (c.split('\n')[0], e.get('REASON'))
+                    ret = False
+            return ret
+        finally:
+            self._cmdlock.release()
+
+    def current(self, cmds, instance):
+        # grammar commands apply to the current recognition process
+        if instance is not None and len(cmds) > 0:
+            cmds[0] = "CURRENTPROCESS %s\n" % (instance,) + cmds[0]
+        return cmds
+
+    def addgrammars(self, grams, instance=None):
+        # register grammars (list of (name, data)) with a single SYNCGRAM,
+        # the grammars are recorded only once julius has accepted them
+        st = self._states[instance]
+        cmds = []
+        first = st._firstgrammar
+        for (name, data) in grams:
+            if first == True:
+                cmd = "CHANGEGRAM %s\n" % (name,)
+                first = False
+            else:
+                cmd = "ADDGRAM %s\n" % (name,)
+            cmds.append(cmd + data.encode('euc_jp', 'backslashreplace'))
+        cmds.append("SYNCGRAM\n")
+        if self.command(self.current(cmds, instance)) == False:
+            return False
+        st._firstgrammar = first
+        for (name, data) in grams:
+            st._grammardata.append((name, data))
+            st._grammars[name] = self._gramids[instance]
+            self._gramids[instance] += 1
+            st._activegrammars[name] = True
+        return True
+
+    def addgrammar(self, data, name, instance=None):
+        return self.addgrammars([(name, data)], instance)
+
+    def setactivegrammars(self, names, instance=None):
+        # apply a whole active set change with a single SYNCGRAM and
+        # return the time taken (in seconds), or None if it failed
+        st = self._states[instance]
+        t = time.time()
+        cmds = []
+        for name in names:
+            if not st._grammars.has_key(name):
+                print "[error] unknown grammar: %s" % (name,)
+                return None
+        for name in names:
+            if not st._activegrammars.has_key(name):
+                print "ACTIVATEGRAM %s" % (name,)
+                cmds.append("ACTIVATEGRAM\n%s\n" % (name,))
+        for name in st._activegrammars.keys():
+            if name not in names:
+                print "DEACTIVATEGRAM %s" % (name,)
+                cmds.append("DEACTIVATEGRAM\n%s\n" % (name,))
+        if len(cmds) > 0:
+            cmds.append("SYNCGRAM\n")
+            if self.command(self.current(cmds, instance)) == False:
+                return None
+        st._activegrammars = dict([(name, True) for name in names])
+        return time.time() - t
+
+    def activategrammar(self, name, instance=None):
+        return self.setactivegrammars(self._states[instance]._activegrammars.keys() + [name,], instance)
+
+    def deactivategrammar(self, name, instance=None):
+        return self.setactivegrammars([g for g in self._states[instance]._activegrammars.keys() if g != name], instance)
+
+    def syncgrammar(self, instance=None):
+        return self.command(self.current(["SYNCGRAM\n"], instance))
+
+    def switchgrammar(self, name, instance=None):
+        return self.setactivegrammars([name,], instance)
+
+    def addwords(self, words, like, instance=None):
+        # add words (list of (word, [phones, ...])) as alternatives of the
+        # word "like" to every grammar having it, with a single SYNCGRAM
+        st = self._states[instance]
+        cmds = []
+        for i in range(0, len(st._grammardata)):
+            (name, data) = st._grammardata[i]
+            category = dictcategory(data, like)
+            if category is None:
+                continue
+            entries = u"".join([u"%s\t[%s]\t%s\n" % (category, w, p) for (w, phones) in words for p in phones])
+            # keep the words for the registration after a restart
+            st._grammardata[i] = (name, data[:data.rindex(u"DICEND\n")] + entries + u"DICEND\n")
+            cmds.append("ADDWORD\n%i\n" % (st._grammars[name],) + entries.encode('euc_jp', 'backslashreplace') + "DICEND\n")
+        if len(cmds) == 0:
+            print "[error] no grammar has the word: %s" % (like,)
+            return False
+        cmds.append("SYNCGRAM\n")
+        return self.command(self.current(cmds, instance))
+
+    def removewords(self, words, instance=None):
+        # julius cannot remove words from a grammar: register the grammars
+        # again without them
+        st = self._states[instance]
+        words = set([u"[%s]" % (w,) for w in words])
+        grams = []
+        changed = False
+        for (name, data) in st._grammardata:
+            (dfa, dic) = data.split(u"DFAEND\n", 1)
+            lines = dic.splitlines(True)
+            kept = [l for l in lines if l.split(u"\t")[1:2] == [] or l.split(u"\t")[1] not in words]
+            if len(kept) != len(lines):
+                changed = True
+            grams.append((name, dfa + u"DFAEND\n" + u"".join(kept)))
+        if changed == False:
+            return True
+        return self.reloadgrammars(grams, st._activegrammars.keys(), instance)
+
+    def setcallback(self, func, instance=None):
+        self._callbacks.append((func, instance))
+
+class JuliusInstance:
+    """ One recognizer (-SR) of a julius shared in the multi-instance mode.
+
+    Has the same interface as JuliusWrap so that a component can use either.
+    All the instances recognize the same audio, fed by the one instance
+    created as the feeder: writing audio to any other is an error. A paused
+    instance gets no results. Julius is terminated when every instance is
+    released.
+    """
+
+    CB_DOCUMENT = JuliusWrap.CB_DOCUMENT
+    CB_LOGWAVE = JuliusWrap.CB_LOGWAVE
+
+    def __init__(self, wrap, name, feeder=False):
+        self._wrap = wrap
+        self._name = name
+        self._sender = wrap._sender
+        self._released = False
+        self._refused = False
+        wrap._users.add(name)
+        if feeder:
+            wrap._feeder = name
+
+    def start(self):
+        pass # started by the owner of the shared julius
+
+    def join(self, timeout=None):
+        if len(self._wrap._users) == 0:
+            self._wrap.join(timeout)
+
+    def terminate(self):
+        if self._released:
+            return 0
+        self._released = True
+        self._wrap._users.discard(self._name)
+        self._wrap.pause(self._name)
+        if len(self._wrap._users) == 0:
+            return self._wrap.terminate()
+        return 0
+
+    def setcallback(self, func):
+        self._wrap.setcallback(func, self._name)
+
+    def waitready(self, timeout=10.0):
+        return self._wrap.waitready(timeout)
+
+    def pause(self):
+        self._wrap.pause(self._name)
+
+    def resume(self):
+        self._wrap.resume(self._name)
+
+    def feedsaudio(self):
+        return self._wrap._feeder == self._name
+
+    def write(self, data, t=None):
+        if self.feedsaudio():
+            return self._wrap.write(data, t)
+        if self._refused == False:
+            print "[error] %s does not take audio: the shared julius recognizes the audio of %s" % (self._name, self._wrap._feeder)
+            self._refused = True
+        return 0
+
+    def setoverloadpolicy(self, policy):
+        # one sender for all the instances: the latest policy applies
+        self._wrap.setoverloadpolicy(policy)
+
+    def reconfigure(self, options):
+        return self._wrap.reconfigure(options, self._name)
+
+    def health(self):
+        return self._wrap.health()
+
+    def addgrammars(self, grams):
+        return self._wrap.addgrammars(grams, self._name)
+
+    def addgrammar(self, data, name):
+        return self._wrap.addgrammar(data, name, self._name)
+
+    def setactivegrammars(self, names):
+        return self._wrap.setactivegrammars(names, self._name)
+
+    def activategrammar(self, name):
+        return self._wrap.activategrammar(name, self._name)
+
+    def deactivategrammar(self, name):
+        return self._wrap.deactivategrammar(name, self._name)
+
+    def syncgrammar(self):
+        return self._wrap.syncgrammar(self._name)
+
+    def switchgrammar(self, name):
+        return self._wrap.switchgrammar(name, self._name)
+
+    def addwords(self, words, like):
+        return self._wrap.addwords(words, like, self._name)
+
+    def removewords(self, words):
+        return self._wrap.removewords(words, self._name)
+
+def dictcategory(data, word):
+    # category of the word in the dictionary of the grammar data
+    entry = u"[%s]" % (word,)
+    for l in data.split(u"DFAEND\n", 1)[1].splitlines():
+        t = l.split(u"\t")
+        if len(t) > 2 and t[1] == entry:
+            return t[0]
+    return None
+
+def tobigendian(data):
+    # julius reads the raw samples from stdin in big endian
+    if sys.byteorder == 'big':
+        return data
+    a = array.array('h', data[:len(data) / 2 * 2])
+    a.byteswap()
+    return a.tostring()
+
+def isnumber(s):
+    try:
+        float(s)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Latency measurement of recognized utterances
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import time
+import platform
+from collections import deque
+
+def _monotonicfunc():
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    if platform.system() == 'Linux':
+        try:
+            import ctypes
+            class timespec(ctypes.Structure):
+                _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+            try:
+                librt = ctypes.CDLL('librt.so.1', use_errno=True)
+            except OSError:
+                librt = ctypes.CDLL('libc.so.6', use_errno=True)
+            clock_gettime = librt.clock_gettime
+            clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+            CLOCK_MONOTONIC = 1
+            def monotonic():
+                t = timespec()
+                if clock_gettime(CLOCK_MONOTONIC, ctypes.pointer(t)) != 0:
+                    return time.time()
+                return t.tv_sec + t.tv_nsec * 1e-9
+            monotonic()
+            return monotonic
+        except (OSError, AttributeError):
+            pass
+    # not monotonic, but the best we have
+    return time.time
+
+monotonic = _monotonicfunc()
+
+class UtteranceTimeline:
+    """ Timestamps (monotonic clock) of the processing stages of an utterance.
+
+    firstaudio -- first audio packet sent after the previous utterance
+    startrec   -- STARTREC received from julius
+    endrec     -- ENDREC received from julius
+    recogout   -- RECOGOUT received from julius
+    built      -- result document built
+    written    -- result written to the outport
+    """
+
+    STAGES = ('firstaudio', 'startrec', 'endrec', 'recogout', 'built', 'written')
+
+    # name of the interval: (from stage, to stage)
+    INTERVALS = (('detect', 'firstaudio', 'startrec'),
+                 ('speech', 'startrec', 'endrec'),
+                 ('decode', 'endrec', 'recogout'),
+                 ('build', 'recogout', 'built'),
+                 ('write', 'built', 'written'),
+                 ('total', 'firstaudio', 'written'))
+
+    def __init__(self):
+        self._marks = {}
+        self._duration = None # length of the utterance in seconds
+
+    def mark(self, stage, t=None):
+        if t is None:
+            t = monotonic()
+        if stage not in self._marks:
+            self._marks[stage] = t
+
+    def setduration(self, sec):
+        self._duration = sec
+
+    def intervals(self):
+        # returns {interval name: seconds} of the intervals whose stages are marked
+        ret = {}
+        for (name, s, e) in self.INTERVALS:
+            if s in self._marks and e in self._marks:
+                ret[name] = self._marks[e] - self._marks[s]
+        return ret
+
+    def rtf(self):
+        """ Real time factor: processing time left after the end of the
+        speech (the speech itself arrives in real time) over the length of
+        the utterance.
+
+        >>> tl = UtteranceTimeline()
+        >>> tl.mark('startrec', 10.0)
+        >>> tl.mark('endrec', 12.0)
+        >>> tl.mark('recogout', 12.5)
+        >>> tl.rtf()
+        0.25
+        """
+        if 'endrec' not in self._marks or 'recogout' not in self._marks:
+            return None
+        duration = self._duration
+        if not duration and 'startrec' in self._marks:
+            duration = self._marks['endrec'] - self._marks['startrec']
+        if not duration:
+            return None
+        return (self._marks['recogout'] - self._marks['endrec']) / duration
+
+class LatencyStats:
+    """ Rolling percentiles of the latest utterance timelines.
+
+    >>> s = LatencyStats(window=10)
+    >>> for i in range(1, 21):
+    ...     s.add({'total': i / 10.0}, i / 100.0)
+    >>> s.percentile('total', 50)
+    1.5
+    >>> s.summary()
+    'rtf p50/p90/p99=0.15/0.19/0.20 total p50/p90/p99=1500/1900/2000ms (10 utterances)'
+    """
+
+    def __init__(self, window=100):
+        self._window = window
+        self._values = {}
+        self._count = 0
+
+    def add(self, intervals, rtf=None):
+        if rtf is not None:
+            intervals = dict(intervals)
+            intervals['rtf'] = rtf
+        for (k, v) in intervals.items():
+            if k not in self._values:
+                self._values[k] = deque(maxlen=self._window)
+            self._values[k].append(v)
+        self._count += 1
+
+    def count(self):
+        return self._count
+
+    def percentile(self, name, p):
+        v = sorted(self._values.get(name, []))
+        if len(v) == 0:
+            return None
+        # nearest rank
+        i = int(len(v) * p / 100.0 + 0.5) - 1
+        return v[min(max(i, 0), len(v) - 1)]
+
+    def summary(self):
+        ret = []
+        n = 0
+        for k in sorted(self._values.keys()):
+            n = max(n, len(self._values[k]))
+            (p50, p90, p99) = [self.percentile(k, p) for p in (50, 90, 99)]
+            if k == 'rtf':
+                ret.append("%s p50/p90/p99=%.2f/%.2f/%.2f" % (k, p50, p90, p99))
+            else:
+                ret.append("%s p50/p90/p99=%.0f/%.0f/%.0fms" % (k, p50 * 1000, p90 * 1000, p99 * 1000))
+        return " ".join(ret) + " (%i utterances)" % (n,)
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -103,7 +103,54 @@ create table data (
                             p.append(p1 + p2)
                     break
         return list(set(p))
-        
+
+class Pronouncer:
+    ''' Pronunciations of words in the phone set of the julius models'''
+
+    def __init__(self, lang, lexdb=None):
+        self._lang = lang
+        if lexdb is None:
+            lexdb = LexiconDB(config()._lexicondb, __version__)
+        self._lexdb = lexdb
+        self._conv = None
+        self._kana = None
+        if lang in ('jp', 'ja'):
+            from openhrivoice.hiragana2phoneme import hiragana2phoneme
+            self._conv = hiragana2phoneme()
+            from openhrivoice.katakana2hiragana import katakana2hiragana
+            self._kana = katakana2hiragana()
+        elif lang == 'de':
+            from openhrivoice.sampa2simon import ipa2simon
+            self._conv = ipa2simon()
+
+    def silence(self):
+        # pronunciations of the sentence start and end markers
+        if self._lang in ('jp', 'ja'):
+            return {'<s>': ('silB',), '</s>': ('silE',)}
+        return {'<s>': ('sil',), '</s>': ('sil',)}
+
+    def lookup(self, text):
+        # pronunciations in the alphabet of the database (kana, ARPAbet, IPA)
+        if self._lang in ('jp', 'ja'):
+            p = self._lexdb.substringlookup(text)
+            if len(p) == 0:
+                p = self._lexdb.substringlookup(self._kana.convert(text))
+            return p
+        return self._lexdb.lookup(text)
+
+    def convert(self, pronounce):
+        if self._conv is None:
+            return pronounce
+        return self._conv.convert(pronounce)
+
+    def pronounce(self, text, pronounce=None):
+        # phones of the word (or of the given pronunciation)
+        if pronounce is not None:
+            if self._kana is not None:
+                pronounce = self._kana.convert(pronounce)
+            return [self.convert(pronounce)]
+        return [self.convert(p) for p in self.lookup(text)]
+
 if __name__ == '__main__':
     import sys
     import locale
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Determinization and minimization of grammar automata
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+__doc__ = '''Determinization and minimization of grammar automata.
+
+The automata are lists of arcs (fromstate, label, tostate) as given to
+julius: the initial state is 0 and every final state s is marked by an
+entry (s, -1, -1).
+'''
+
+FINAL = -1
+
+def parse(arcs):
+    # (transitions {state: [(label, state), ...]}, set of final states, states)
+    trans = {}
+    finals = set()
+    states = set([0])
+    for (f, l, t) in arcs:
+        states.add(f)
+        if l == FINAL:
+            finals.add(f)
+            continue
+        states.add(t)
+        trans.setdefault(f, []).append((l, t))
+    return (trans, finals, states)
+
+def stats(arcs):
+    """ Number of states and arcs.
+
+    >>> stats([(0, 'a', 1), (1, 'b', 2), (2, -1, -1)])
+    (3, 2)
+    """
+    (trans, finals, states) = parse(arcs)
+    return (len(states), sum([len(v) for v in trans.values()]))
+
+def trim(trans, finals):
+    # drop the transitions to the states which can not reach a final state
+    rev = {}
+    for (f, ts) in trans.items():
+        for (l, t) in ts:
+            rev.setdefault(t, []).append(f)
+    live = set(finals)
+    stack = list(finals)
+    while len(stack) > 0:
+        for f in rev.get(stack.pop(), []):
+            if f not in live:
+                live.add(f)
+                stack.append(f)
+    ret = {}
+    for (f, ts) in trans.items():
+        if f in live:
+            ret[f] = [(l, t) for (l, t) in ts if t in live]
+    return ret
+
+def determinize(arcs):
+    """ Subset construction (the result is numbered in breadth first order).
+
+    >>> determinize([(0, 'a', 1), (0, 'a', 2), (1, 'b', 3), (2, 'c', 3), (3, -1, -1)])
+    [(0, 'a', 1), (1, 'b', 2), (1, 'c', 2), (2, -1, -1)]
+    """
+    (trans, finals, states) = parse(arcs)
+    trans = trim(trans, finals)
+    initial = frozenset([0])
+    ids = {initial: 0}
+    queue = [initial]
+    ret = []
+    i = 0
+    while i < len(queue):
+        subset = queue[i]
+        i += 1
+        targets = {}
+        for s in subset:
+            for (l, t) in trans.get(s, []):
+                targets.setdefault(l, set()).add(t)
+        for l in sorted(targets.keys()):
+            t = frozenset(targets[l])
+            if not ids.has_key(t):
+                ids[t] = len(ids)
+                queue.append(t)
+            ret.append((ids[subset], l, ids[t]))
+        if len(subset & finals) > 0:
+            ret.append((ids[subset], FINAL, FINAL))
+    return ret
+
+def minimize(arcs):
+    """ Hopcroft's partition refinement of a deterministic automaton (the
+    result is numbered in breadth first order).
+
+    >>> minimize([(0, 'a', 1), (0, 'b', 2), (1, 'c', 3), (2, 'c', 4), (3, -1, -1), (4, -1, -1)])
+    [(0, 'a', 1), (0, 'b', 1), (1, 'c', 2), (2, -1, -1)]
+    """
+    (trans, finals, states) = parse(arcs)
+    inv = {} # state: [(label, fromstate), ...]
+    for (f, ts) in trans.items():
+        for (l, t) in ts:
+            inv.setdefault(t, []).append((l, f))
+    blocks = [b for b in (set(finals), states - finals) if len(b) > 0]
+    blockof = {}
+    for i in range(0, len(blocks)):
+        for s in blocks[i]:
+            blockof[s] = i
+    # every initial block is a splitter as the transitions are partial
+    work = range(0, len(blocks))
+    inwork = set(work)
+    while len(work) > 0:
+        b = work.pop()
+        inwork.discard(b)
+        pre = {} # label: states with the transition into the block
+        for t in list(blocks[b]):
+            for (l, f) in inv.get(t, []):
+                pre.setdefault(l, set()).add(f)
+        for x in pre.values():
+            touched = {}
+            for s in x:
+                touched.setdefault(blockof[s], []).append(s)
+            for (y, ys) in touched.items():
+                if len(ys) == len(blocks[y]):
+                    continue
+                new = len(blocks)
+                blocks.append(set(ys))
+                blocks[y] -= blocks[new]
+                for s in ys:
+                    blockof[s] = new
+                if y in inwork or len(blocks[new]) <= len(blocks[y]):
+                    work.append(new)
+                    inwork.add(new)
+                else:
+                    work.append(y)
+                    inwork.add(y)
+    # quotient automaton numbered from the block of the initial state
+    ids = {blockof[0]: 0}
+    queue = [0]
+    ret = []
+    i = 0
+    while i < len(queue):
+        s = queue[i]
+        i += 1
+        b = blockof[s]
+        for (l, t) in sorted(trans.get(s, [])):
+            if not ids.has_key(blockof[t]):
+                ids[blockof[t]] = len(ids)
+                queue.append(t)
+            ret.append((ids[b], l, ids[blockof[t]]))
+        if s in finals:
+            ret.append((ids[b], FINAL, FINAL))
+    return ret
+
+def categories(arcs):
+    """ Merge the labels having the same transitions into categories.
+
+    Returns the automaton labelled by the category numbers and the labels
+    of each category.
+
+    >>> categories([(0, 'b', 1), (0, 'a', 1), (1, 'c', 2), (2, -1, -1)])
+    ([(0, 0, 1), (1, 1, 2), (2, -1, -1)], [['a', 'b'], ['c']])
+    """
+    places = {} # label: transitions with the label
+    for (f, l, t) in arcs:
+        if l != FINAL:
+            places.setdefault(l, set()).add((f, t))
+    ids = {}
+    cats = []
+    catof = {}
+    for l in sorted(places.keys()):
+        k = frozenset(places[l])
+        if not ids.has_key(k):
+            ids[k] = len(cats)
+            cats.append([])
+        cats[ids[k]].append(l)
+        catof[l] = ids[k]
+    ret = []
+    seen = set()
+    for (f, l, t) in arcs:
+        if l != FINAL:
+            l = catof[l]
+            if (f, l, t) in seen:
+                continue
+            seen.add((f, l, t))
+        ret.append((f, l, t))
+    return (ret, cats)
+
+def expand(arcs, cats):
+    """ Relabel the arcs of the categories with their labels.
+
+    >>> expand([(0, 0, 1), (1, -1, -1)], [['a', 'b']])
+    [(0, 'a', 1), (0, 'b', 1), (1, -1, -1)]
+    """
+    ret = []
+    for (f, l, t) in arcs:
+        if l == FINAL:
+            ret.append((f, l, t))
+        else:
+            ret.extend([(f, w, t) for w in cats[l]])
+    return ret
+
+def optimize(arcs):
+    return minimize(determinize(arcs))
+
+def equivalent(a, b):
+    """ Whether two automata accept the same label sequences.
+
+    >>> equivalent([(0, 'a', 1), (0, 'a', 2), (1, -1, -1), (2, 'b', 1)], [(0, 'a', 1), (1, 'b', 2), (1, -1, -1), (2, -1, -1)])
+    True
+    >>> equivalent([(0, 'a', 1), (1, -1, -1)], [(0, 'b', 1), (1, -1, -1)])
+    False
+    """
+    (ta, fa, sa) = parse(determinize(a))
+    (tb, fb, sb) = parse(determinize(b))
+    seen = set([(0, 0)])
+    stack = [(0, 0)]
+    while len(stack) > 0:
+        (p, q) = stack.pop()
+        if (p in fa) != (q in fb):
+            return False
+        da = dict(ta.get(p, []))
+        db = dict(tb.get(q, []))
+        if set(da.keys()) != set(db.keys()):
+            return False
+        for l in da.keys():
+            n = (da[l], db[l])
+            if n not in seen:
+                seen.add(n)
+                stack.append(n)
+    return True
+
+def sentences(arcs, maxlen=10):
+    """ Accepted label sequences up to the given length (for inspection).
+
+    >>> sentences([(0, 'a', 1), (1, 'b', 1), (1, -1, -1)], 3)
+    [('a',), ('a', 'b'), ('a', 'b', 'b')]
+    """
+    (trans, finals, states) = parse(arcs)
+    ret = set()
+    stack = [(0, ())]
+    while len(stack) > 0:
+        (s, seq) = stack.pop()
+        if s in finals:
+            ret.add(seq)
+        if len(seq) < maxlen:
+            for (l, t) in trans.get(s, []):
+                stack.append((t, seq + (l,)))
+    return sorted(ret)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Julius module protocol parser
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import re
+
+# Julius does not escape attribute values (e.g. WORD="<s>"), so the messages
+# are not well-formed XML. The tags are simple enough to be tokenized here.
+_tagre = re.compile(r'<(/?)([A-Z_]+)((?:\s+[A-Z_]+="[^"]*")*)\s*(/?)>')
+_attrre = re.compile(r'([A-Z_]+)="([^"]*)"')
+
+class ModuleEvent:
+    """ Message received from Julius in module mode."""
+
+    def __init__(self, name, attrs):
+        self._name = name
+        self._attrs = attrs
+        self._received = None # set by the receiver (monotonic clock)
+
+    def get(self, key, default=None):
+        return self._attrs.get(key, default)
+
+class InputEvent(ModuleEvent):
+    """ <INPUT STATUS="..."/> (one of LISTEN, STARTREC, ENDREC)."""
+
+    def __init__(self, name, attrs):
+        ModuleEvent.__init__(self, name, attrs)
+        self._status = attrs.get('STATUS')
+        self._time = attrs.get('TIME')
+
+class RejectedEvent(ModuleEvent):
+    """ <REJECTED REASON="..."/>"""
+
+    def __init__(self, name, attrs):
+        ModuleEvent.__init__(self, name, attrs)
+        self._reason = attrs.get('REASON')
+
+class GraminfoEvent(ModuleEvent):
+    """ <GRAMINFO>...</GRAMINFO>"""
+
+    def __init__(self, name, attrs, text):
+        ModuleEvent.__init__(self, name, attrs)
+        self._text = text
+
+class Word:
+    """ <WHYPO/> element of a hypothesis."""
+
+    def __init__(self, attrs):
+        self._word = attrs.get('WORD', u'')
+        self._classid = attrs.get('CLASSID')
+        self._phone = attrs.get('PHONE')
+        self._cm = attrs.get('CM', u'0')
+
+class Hypothesis:
+    """ <SHYPO> (final) or <PHYPO> (progressive) element."""
+
+    def __init__(self, name, attrs):
+        self._name = name
+        self._rank = attrs.get('RANK', u'1')
+        self._score = attrs.get('SCORE', u'0')
+        self._gram = attrs.get('GRAM')
+        self._frame = attrs.get('FRAME')
+        self._words = []
+
+class RecogoutEvent(ModuleEvent):
+    """ <RECOGOUT> with its hypotheses."""
+
+    def __init__(self, name, attrs):
+        ModuleEvent.__init__(self, name, attrs)
+        self._hypos = []
+
+class JuliusModuleParser:
+    """ Incremental parser for the output of Julius in module mode.
+
+    Bytes read from the module socket are given to feed() as they arrive.
+    Each message is delimited by a line containing only '.', and is decoded
+    and parsed exactly once when its delimiter arrives.
+
+    >>> p = JuliusModuleParser()
+    >>> p.feed('<INPUT STATUS="LISTEN" TIME="1"/>\\n.\\n<RECOGOUT>\\n')
+    >>> [e._status for e in p.events()]
+    [u'LISTEN']
+    >>> p.feed('  <SHYPO RANK="1" SCORE="-1.0">\\n    <WHYPO WORD="<s>" CM="1.0"/>\\n')
+    >>> p.feed('  </SHYPO>\\n</RECOGOUT>\\n.\\n')
+    >>> e = p.events()[0]
+    >>> [w._word for w in e._hypos[0]._words]
+    [u'<s>']
+    """
+
+    def __init__(self, encoding='euc_jp'):
+        self._encoding = encoding
+        self._buf = ''
+        self._scan = 0
+        self._events = []
+
+    def feed(self, data):
+        buf = self._buf + data
+        start = 0
+        # only the tail that has not been searched yet is scanned
+        scan = self._scan
+        while True:
+            end = buf.find('\n.\n', max(scan - 2, start))
+            if end < 0:
+                break
+            self.parsemessage(buf[start:end+1])
+            start = end + 3
+            scan = start
+        self._buf = buf[start:]
+        self._scan = len(self._buf)
+
+    def reset(self):
+        # discard everything received so far (e.g. on reconnection)
+        self._buf = ''
+        self._scan = 0
+        self._events = []
+
+    def events(self):
+        events = self._events
+        self._events = []
+        return events
+
+    def parsemessage(self, msg):
+        msg = unicode(msg, self._encoding, 'replace')
+        top = None
+        hypo = None
+        for m in _tagre.finditer(msg):
+            (closing, name, attrstr, empty) = m.groups()
+            if closing:
+                if top is not None and name == top._name:
+                    if isinstance(top, GraminfoEvent):
+                        top._text = msg[topend:m.start()].strip(u'\n')
+                    self._events.append(top)
+                    top = None
+                elif hypo is not None and name == hypo._name:
+                    hypo = None
+                continue
+            attrs = dict(_attrre.findall(attrstr))
+            if top is None:
+                if name == 'INPUT':
+                    top = InputEvent(name, attrs)
+                elif name == 'REJECTED':
+                    top = RejectedEvent(name, attrs)
+                elif name == 'RECOGOUT':
+                    top = RecogoutEvent(name, attrs)
+                elif name == 'GRAMINFO':
+                    top = GraminfoEvent(name, attrs, u'')
+                    topend = m.end()
+                else:
+                    top = ModuleEvent(name, attrs)
+                if empty:
+                    self._events.append(top)
+                    top = None
+            elif name in ('SHYPO', 'PHYPO'):
+                hypo = Hypothesis(name, attrs)
+                top._hypos.append(hypo)
+            elif name == 'WHYPO' and hypo is not None:
+                hypo._words.append(Word(attrs))
+
+def _benchmark():
+    import time
+    try:
+        from BeautifulSoup import BeautifulSoup
+    except ImportError:
+        BeautifulSoup = None
+    words = [u'<s>', u'りんご', u'を', u'ください', u'</s>']
+    shypos = u''
+    for r in range(1, 6):
+        shypos += u'  <SHYPO RANK="%i" SCORE="-%i.0" GRAM="0">\n' % (r, r * 1000)
+        for w in words:
+            shypos += u'    <WHYPO WORD="%s" CLASSID="0" PHONE="a i u" CM="0.900"/>\n' % (w,)
+        shypos += u'  </SHYPO>\n'
+    utterance = (u'<INPUT STATUS="STARTREC" TIME="1"/>\n.\n'
+                 u'<INPUT STATUS="ENDREC" TIME="2"/>\n.\n'
+                 u'<RECOGOUT>\n' + shypos + u'</RECOGOUT>\n.\n'
+                 u'<INPUT STATUS="LISTEN" TIME="3"/>\n.\n').encode('euc_jp')
+    stream = utterance * 200
+    chunks = [stream[i:i+1024] for i in range(0, len(stream), 1024)]
+
+    p = JuliusModuleParser()
+    t = time.time()
+    count = 0
+    for c in chunks:
+        p.feed(c)
+        count += len(p.events())
+    dt = time.time() - t
+    print "JuliusModuleParser: %i messages in %.3f sec (%.1f usec/message)" % (count, dt, dt * 1e6 / count)
+
+    if BeautifulSoup is None:
+        print "BeautifulSoup is not installed"
+        return
+    prevdata = u''
+    t = time.time()
+    count = 0
+    for c in chunks:
+        ds = (prevdata + unicode(c, 'euc_jp', 'replace')).split(u".\n")
+        prevdata = ds[-1]
+        for d in ds[0:-1]:
+            dx = BeautifulSoup(d)
+            for s in dx.first().findAll('shypo'):
+                s.findAll('whypo')
+            count += 1
+    dt = time.time() - t
+    print "BeautifulSoup: %i messages in %.3f sec (%.1f usec/message)" % (count, dt, dt * 1e6 / count)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+    _benchmark()
@@ -13,12 +13,13 @@ Licensed under the Eclipse Public License -v 1.0 (EPL)
 http://www.opensource.org/licenses/eclipse-1.0.txt
 '''
 
-import sys, os, re, codecs, types
+import sys, os, re, codecs, types, hashlib
 from lxml import etree
 from StringIO import StringIO
 from openhrivoice.__init__ import __version__
 from openhrivoice.config import config
 from openhrivoice.lexicondb import *
+from openhrivoice import minimizedfa
 
 def isempty(node):
     if node.nodeName == '#text':
@@ -26,6 +27,29 @@ def isempty(node):
             return True
     return False
 
+def parserepeat(repeat):
+    """ Minimum and maximum count of a repeat attribute (None for no maximum).
+
+    >>> parserepeat("0-1")
+    (0, 1)
+    >>> parserepeat("3")
+    (3, 3)
+    >>> parserepeat("1-")
+    (1, None)
+    """
+    try:
+        rp = repeat.split('-')
+        repeatmin = int(rp[0])
+        if len(rp) == 1:
+            return (repeatmin, repeatmin)
+        if len(rp) == 2 and rp[1] == '':
+            return (repeatmin, None)
+        if len(rp) == 2 and int(rp[1]) >= repeatmin:
+            return (repeatmin, int(rp[1]))
+    except ValueError:
+        pass
+    raise KeyError("invalid repeat: %s" % (repeat,))
+
 class nulltransform:
     def convert(self, text):
         return text
@@ -79,6 +103,43 @@ class PLS:
             print e
         return self
 
+class CompileContext:
+    """ Lexicons, pronunciation database and converters shared by the
+    compilation of the rules of a grammar."""
+
+    def __init__(self, srgs):
+        self._lex = None
+        if srgs._lex is not None:
+            self._lex = PLS().parse(srgs._lex)
+        self._pron = Pronouncer(srgs._lang, LexiconDB(srgs._config._lexicondb, __version__))
+        self._phones = {} # word: phones (or None if unknown)
+
+    def silence(self):
+        # (not converted)
+        return self._pron.silence()
+
+    def phones(self, word):
+        # converted pronunciations of the word, looked up once per grammar
+        try:
+            return self._phones[word]
+        except KeyError:
+            pass
+        p = None
+        if self._lex is not None:
+            p = self._lex._dict.get(word)
+        if p is None:
+            p = self._pron.lookup(word)
+        ret = None
+        if len(p) > 0:
+            ret = [self.convert(v) for v in p]
+        self._phones[word] = ret
+        return ret
+
+    def convert(self, p):
+        if p in ('sil', 'silE', 'silB', ''):
+            return p
+        return self._pron.convert(p)
+
 class SRGSItem:
     def __init__(self):
         self._type = None
@@ -87,18 +148,11 @@ class SRGSItem:
     def parse(self, node):
         self._type = node.tag.replace('{http://www.w3.org/2001/06/grammar}', '')
         if self._type == "item":
-            self._repeatmin = None
-            self._repeatmax = None
-            try:
-                repeat = node.attrib['repeat']
-                if repeat:
-                    rp = repeat.split('-')
-                    if rp[0]:
-                        self._repeatmin = int(rp[0])
-                    if rp[1]:
-                        self._repeatmax = int(rp[1])
-            except KeyError:
-                pass
+            self._repeatmin = 1
+            self._repeatmax = 1
+            repeat = node.get('repeat')
+            if repeat:
+                (self._repeatmin, self._repeatmax) = parserepeat(repeat)
             children = node.getchildren()
             if len(children) > 0:
                 self._items = [SRGSItem().parse(c) for c in node.getchildren() if type(c) is not etree._Comment]
@@ -131,6 +185,9 @@ class SRGSRule:
 class SRGS:
     """ Utility class to parse W3C Speech Recognition Grammar Specification."""
 
+    # increment when the output of toJulius changes (invalidates GrammarCache)
+    CONVERTER_VERSION = "4"
+
     def __init__(self, file):
         self._config = config()
         self._filename = file
@@ -139,6 +196,7 @@ class SRGS:
         self._rootrule = None
         self._lex = None
         self._node = None
+        self._stats = {} # rule: (states, arcs) before and after the minimization
         try:
             doc = etree.parse(file)
             doc.xinclude()
@@ -162,6 +220,24 @@ class SRGS:
             self._rules[rr._id] = rr
         self._rootrule = node.get('root')
 
+    def cachekey(self, rootrule = None):
+        if rootrule is None:
+            rootrule = self._rootrule
+        h = hashlib.sha1()
+        h.update(self.CONVERTER_VERSION)
+        h.update(__version__) # version of the LexiconDB
+        h.update(rootrule.encode('utf-8'))
+        h.update(etree.tostring(self._node)) # after xinclude
+        if self._lex is not None:
+            for l in self._lex:
+                try:
+                    f = open(l, 'rb')
+                    h.update(f.read())
+                    f.close()
+                except IOError:
+                    h.update(l.encode('utf-8'))
+        return h.hexdigest()
+
     def wordlist_recur(self, item, words):
         if item._type == "#text":
             words.extend(item._words)
@@ -194,47 +270,7 @@ class SRGS:
                 currentstate = newstate
             dfa.append((currentstate, item._words[-1], endstate))
         elif item._type == "item":
-            if item._repeatmax:
-                currentstate = startstate
-                if item._repeatmax == 1:
-                    for i in item._items[:-1]:
-                        newstate = dfa.newstate()
-                        self.toJulius_recur(i, dfa, currentstate, newstate)
-                        currentstate = newstate
-                    self.toJulius_recur(item._items[-1], dfa, currentstate, endstate)
-                else:
-                    for l in range(0, item._repeatmax - 1):
-                        newstate = dfa.newstate()
-                        currentstate2 = currentstate
-                        for i in item._items[:-1]:
-                            newstate2 = dfa.newstate()
-                            self.toJulius_recur(i, dfa, currentstate2, newstate2)
-                            currentstate2 = newstate2
-                        self.toJulius_recur(item._items[-1], dfa, currentstate, newstate)
-                        for v in dfa._dfa:
-                            if v[2] == currentstate:
-                                dfa.append((v[0], v[1], endstate))
-                        currentstate = newstate
-                    currentstate2 = currentstate
-                    for i in item._items[:-1]:
-                        newstate2 = dfa.newstate()
-                        self.toJulius_recur(i, dfa, currentstate2, newstate2)
-                        currentstate2 = newstate2
-                    self.toJulius_recur(item._items[-1], dfa, currentstate, endstate)
-                    for v in dfa._dfa:
-                        if v[2] == currentstate:
-                            dfa.append((v[0], v[1], endstate))
-            else:
-                currentstate = startstate
-                for i in item._items[:-1]:
-                    newstate = dfa.newstate()
-                    self.toJulius_recur(i, dfa, currentstate, newstate)
-                    currentstate = newstate
-                self.toJulius_recur(item._items[-1], dfa, currentstate, endstate)
-            if item._repeatmin == 0: # add skip transition
-                for v in dfa._dfa:
-                    if v[2] == startstate:
-                        dfa.append((v[0], v[1], endstate))
+            self.toJulius_repeat(item, dfa, startstate, endstate)
         elif item._type == "one-of":
             for i in item._items:
                 self.toJulius_recur(i, dfa, startstate, endstate)
@@ -245,110 +281,191 @@ class SRGS:
                 root = self._rules[item._uri[1:]]
             except KeyError:
                 raise KeyError("unknown rule: %s" % (item._uri,))
-            currentstate = startstate
-            for i in root._items[:-1]:
-                newstate = dfa.newstate()
-                self.toJulius_recur(i, dfa, currentstate, newstate)
-                currentstate = newstate
-            self.toJulius_recur(root._items[-1], dfa, currentstate, endstate)
+            if dfa._fragments is None:
+                self.toJulius_seq(root._items, dfa, startstate, endstate)
+            else:
+                dfa.splice(self.rulefragment(root, dfa), startstate, endstate)
         elif item._type == "tag":
             pass
+
+    def toJulius_repeat(self, item, dfa, startstate, endstate):
+        # a chain of copies of the item: the copies after the minimum count
+        # may leave to the end state, and an unbounded repeat ends with a
+        # copy looping on its last state instead of being unrolled (splicing
+        # the copies of a bounded repeat saves nothing, see _benchmark)
+        loop = item._repeatmax is None
+        if loop:
+            count = max(item._repeatmin, 1)
+        else:
+            count = item._repeatmax
+        if count == 0:
+            dfa.copyincoming(startstate, endstate)
+            return
+        if not loop or dfa._fragments is None:
+            copy = lambda s, e: self.toJulius_seq(item._items, dfa, s, e)
+        else:
+            # compiled once and copied to every repetition of the loop
+            frag = self.fragment(item._items, dfa)
+            copy = lambda s, e: dfa.splice(frag, s, e)
+        states = [startstate] + [dfa.newstate() for i in range(0, count - 1)]
+        if loop:
+            states.append(dfa.newstate())
+        else:
+            states.append(endstate)
+        for i in range(0, count):
+            copy(states[i], states[i + 1])
+        if loop:
+            copy(states[-1], states[-1])
+            dfa.copyincoming(states[-1], endstate)
+        for i in range(item._repeatmin, count): # add skip transitions
+            dfa.copyincoming(states[i], endstate)
+
+    def toJulius_seq(self, items, dfa, startstate, endstate):
+        currentstate = startstate
+        for i in items[:-1]:
+            newstate = dfa.newstate()
+            self.toJulius_recur(i, dfa, currentstate, newstate)
+            currentstate = newstate
+        self.toJulius_recur(items[-1], dfa, currentstate, endstate)
+
+    def fragment(self, items, dfa):
+        # sub-automaton of the items to be copied with DFA.splice
+        f = DFA()
+        f._fragments = dfa._fragments
+        f._compiling = dfa._compiling
+        (before, entry, exit) = (f.newstate(), f.newstate(), f.newstate())
+        # stands for the arcs to the copy: skip transitions of leading
+        # optional items are copies of it
+        f.append((before, None, entry))
+        self.toJulius_seq(items, f, entry, exit)
+        return (f, before, entry, exit)
+
+    def rulefragment(self, rule, dfa):
+        # sub-automaton of the referenced rule, compiled once per automaton
+        # and copied to every reference
+        frag = dfa._fragments.get(rule._id)
+        if frag is not None:
+            return frag
+        if rule._id in dfa._compiling:
+            raise KeyError("recursive reference to rule: %s" % (rule._id,))
+        dfa._compiling.add(rule._id)
+        try:
+            frag = self.fragment(rule._items, dfa)
+        finally:
+            dfa._compiling.discard(rule._id)
+        dfa._fragments[rule._id] = frag
+        return frag
     
-    def toJulius(self, rootrule = None):
+    def toDFA(self, rootrule = None, dfa = None):
+        # word automaton of the rule (with the sentence start and end markers)
         if rootrule is None:
             root = self._rules[self._rootrule]
         else:
             root = self._rules[rootrule]
-
-        lex = None
-        if self._lex is not None:
-            lex = PLS().parse(self._lex)
-        lexdb = LexiconDB(self._config._lexicondb, __version__)
-
-        dfa = DFA()
+        if dfa is None:
+            dfa = DFA()
         startstate = dfa.newstate()
         dfa.append((dfa.STARTSTATE, '<s>', startstate))
         dfa.append((dfa.ENDSTATE, '</s>', dfa.EOA))
-        currentstate = startstate
-        for i in root._items[:-1]:
-            newstate = dfa.newstate()
-            self.toJulius_recur(i, dfa, currentstate, newstate)
-            currentstate = newstate
-        self.toJulius_recur(root._items[-1], dfa, currentstate, dfa.ENDSTATE)
-        revdfa = dfa.reverse()
-
-        dict = {}
-        if self._lang in ('jp', 'ja'):
-            dict['<s>'] = ('silB',)
-            dict['</s>'] = ('silE',)
-            from openhrivoice.hiragana2phoneme import hiragana2phoneme
-            conv = hiragana2phoneme()
-            from openhrivoice.katakana2hiragana import katakana2hiragana
-            conv2 = katakana2hiragana()
-        elif self._lang == 'de':
-            dict['<s>'] = ('sil',)
-            dict['</s>'] = ('sil',)
-            from openhrivoice.sampa2simon import ipa2simon
-            conv = ipa2simon()
+        if dfa._compiling is not None:
+            dfa._compiling.add(root._id)
+        self.toJulius_seq(root._items, dfa, startstate, dfa.ENDSTATE)
+        return dfa
+
+    def compile_all(self, rules = None, minimize = True):
+        """ Compile the rules (all by default) sharing the lexicons and the
+        pronunciation lookups, and return {rule: DFA and dictionary text}."""
+        if rules is None:
+            rules = self._rules.keys()
+        context = CompileContext(self)
+        ret = {}
+        for r in rules:
+            ret[r] = self.toJulius(r, minimize, context)
+        return ret
+
+    def toJulius(self, rootrule = None, minimize = True, context = None):
+        if context is None:
+            context = CompileContext(self)
+
+        revdfa = self.toDFA(rootrule).reverse()
+        categories = None
+        if minimize:
+            # julius reads the automaton from the end of the sentence
+            before = minimizedfa.stats(revdfa)
+            revdfa = minimizedfa.optimize(revdfa)
+            if len([v for v in revdfa if v[1] == minimizedfa.FINAL]) == 0:
+                raise KeyError("rule accepts no sentence: %s" % (rootrule or self._rootrule,))
+            # words used in the same places share a category
+            (revdfa, categories) = minimizedfa.categories(revdfa)
+            self._stats[rootrule or self._rootrule] = (before, minimizedfa.stats(revdfa))
+            words = [w for c in categories for w in c]
         else:
-            dict['<s>'] = ('sil',)
-            dict['</s>'] = ('sil',)
-            #dict['<sp>'] = ('sp',)
-            conv = nulltransform()
+            words = [v[1] for v in revdfa if v[1] != -1]
+
+        dict = context.silence()
 
         unknownlexicon = []
-        for v in revdfa:
-            if v[1] != -1:
-                if dict.has_key(v[1]) == False:
-                    p = None
-                    if lex is not None:
-                        p = lex._dict.get(v[1])
-                    if p is None:
-                        if self._lang in ('jp', 'ja'):
-                            p = lexdb.substringlookup(v[1])
-                            if len(p) == 0:
-                                p = lexdb.substringlookup(conv2.convert(v[1]))
-                        else:
-                            p = lexdb.lookup(v[1])
-                    if len(p) == 0:
-                        unknownlexicon.append(v[1])
-                    dict[v[1]] = p
+        for w in words:
+            if dict.has_key(w) == False:
+                p = context.phones(w)
+                if p is None:
+                    unknownlexicon.append(w)
+                dict[w] = p
         if len(unknownlexicon) > 0:
             raise KeyError("undefined lexicon: " + ",".join(unknownlexicon))
         dict2id = {}
-        for k in dict.keys():
-            dict2id[k] = len(dict2id)
+        if categories is None:
+            for k in dict.keys():
+                dict2id[k] = len(dict2id)
+        else:
+            for i in range(0, len(categories)):
+                for k in categories[i]:
+                    dict2id[k] = i
 
         jdfa = list()
         for v in revdfa:
             if v[1] == -1:
                 jdfa.append((v[0], v[1], v[2], 1, 0))
                 continue
-            wid = dict2id[v[1]]
+            if categories is None:
+                wid = dict2id[v[1]]
+            else:
+                wid = v[1]
             jdfa.append((v[0], wid, v[2], 0, 0))
         jdfa.sort(lambda x, y: x[0] - y[0])
 
         phonedict = list()
         for k in dict.keys():
             for p in dict[k]:
-                if p in ('sil', 'silE', 'silB', ''):
-                    phonedict.append((dict2id[k], k, p))
-                else:
-                    phonedict.append((dict2id[k], k, conv.convert(p)))
+                phonedict.append((dict2id[k], k, p))
         phonedict.sort(lambda x, y: x[0] - y[0])
 
-        str = u""
-        for d in jdfa:
-            str += u"%i %i %i %i %i\n" % d
-        str += u"DFAEND\n"
-        for p in phonedict:
-            str += u"%i\t[%s]\t%s\n" % p
-        str += u"DICEND\n"
-
-        return str
+        out = [u"%i %i %i %i %i\n" % d for d in jdfa]
+        out.append(u"DFAEND\n")
+        out.extend([u"%i\t[%s]\t%s\n" % p for p in phonedict])
+        out.append(u"DICEND\n")
+        return u"".join(out)
 
 class DFA:
-    """ Utility class to manage DFA """
+    """ Utility class to manage DFA
+
+    The arcs (fromstate, word, tostate) are kept in the order of addition
+    and indexed by their states, so that the arcs of a state are found
+    without scanning the whole automaton.
+
+    >>> dfa = DFA()
+    >>> s = dfa.newstate()
+    >>> dfa.append((dfa.STARTSTATE, 'a', s))
+    >>> dfa.append((s, 'b', dfa.ENDSTATE))
+    >>> dfa.copyincoming(s, dfa.ENDSTATE) # make 'b' optional
+    >>> dfa.incoming(dfa.ENDSTATE)
+    [(2, 'b', 1), (0, 'a', 1)]
+    >>> dfa.outgoing(dfa.STARTSTATE)
+    [(0, 'a', 2), (0, 'a', 1)]
+    >>> dfa.append((s, 'c', s)) # arcs added later are copied too
+    >>> dfa.incoming(dfa.ENDSTATE)
+    [(2, 'b', 1), (0, 'a', 1), (2, 'c', 1)]
+    """
 
     STARTSTATE = 0
     ENDSTATE = 1
@@ -356,14 +473,61 @@ class DFA:
     
     def __init__(self):
         self._dfa = list()
+        self._incoming = {} # state: arcs to the state
+        self._outgoing = {} # state: arcs from the state
+        self._forward = {} # state: states receiving copies of the arcs to the state
         self._totalstate = 2
+        self._fragments = {} # rule id: sub-automaton of the rule
+        self._compiling = set() # rules being compiled (to detect recursion)
 
     def newstate(self):
         self._totalstate += 1
         return self._totalstate - 1
     
     def append(self, value):
-        self._dfa.append(value)
+        targets = [value[2]]
+        i = 0
+        while i < len(targets):
+            for s in self._forward.get(targets[i], []):
+                if s not in targets:
+                    targets.append(s)
+            i += 1
+        for s in targets:
+            v = (value[0], value[1], s)
+            self._dfa.append(v)
+            self._incoming.setdefault(s, []).append(v)
+            self._outgoing.setdefault(v[0], []).append(v)
+
+    def incoming(self, state):
+        return self._incoming.get(state, [])
+
+    def outgoing(self, state):
+        return self._outgoing.get(state, [])
+
+    def copyincoming(self, state, newstate):
+        # arcs to the state also go to the new state (skips the part of
+        # the automaton between them), including the arcs added later
+        # such as the loops of unbounded repeats
+        if state == newstate:
+            return
+        self._forward.setdefault(state, []).append(newstate)
+        for v in list(self.incoming(state)):
+            self.append((v[0], v[1], newstate))
+
+    def splice(self, frag, startstate, endstate):
+        # copy the sub-automaton between the states with new state numbers
+        (f, before, entry, exit) = frag
+        states = {entry: startstate, exit: endstate}
+        for (a, w, b) in f._dfa:
+            if b not in states:
+                states[b] = self.newstate()
+            if a == before:
+                if b != entry:
+                    self.copyincoming(startstate, states[b])
+                continue
+            if a not in states:
+                states[a] = self.newstate()
+            self.append((states[a], w, states[b]))
         
     def reverse(self): # convert dfa into reverse order
         newdfa = list()
@@ -385,5 +549,105 @@ def _test():
     #import profile
     #profile.run('main()')
 
+class _ScanDFA(DFA):
+    # the former construction scanning every arc (for comparison)
+    def copyincoming(self, state, newstate):
+        for v in self._dfa:
+            if v[2] == state:
+                self.append((v[0], v[1], newstate))
+
+class _ExpandDFA(DFA):
+    # the former construction expanding every rule reference (for comparison)
+    def __init__(self):
+        DFA.__init__(self)
+        self._fragments = None
+        self._compiling = None
+
+class _UnrollSRGS(SRGS):
+    # the former construction unrolling every repeat (for comparison)
+    def toJulius_repeat(self, item, dfa, startstate, endstate):
+        if item._repeatmax > 1:
+            currentstate = startstate
+            for l in range(0, item._repeatmax - 1):
+                newstate = dfa.newstate()
+                self.toJulius_seq(item._items, dfa, currentstate, newstate)
+                dfa.copyincoming(currentstate, endstate)
+                currentstate = newstate
+            self.toJulius_seq(item._items, dfa, currentstate, endstate)
+            dfa.copyincoming(currentstate, endstate)
+        else:
+            self.toJulius_seq(item._items, dfa, startstate, endstate)
+        if item._repeatmin == 0: # add skip transition
+            dfa.copyincoming(startstate, endstate)
+
+def _benchmark():
+    # automaton construction of grammars with many optional items
+    import time
+    for n in (1000, 2000, 4000):
+        items = "".join(['<item repeat="0-1">w%i</item><item>x%i</item>' % (i, i) for i in range(0, n)])
+        srgs = SRGS(StringIO('<grammar xmlns="http://www.w3.org/2001/06/grammar" xml:lang="en" version="1.0" root="main"><rule id="main">%s</rule></grammar>' % (items,)))
+        for cls in (DFA, _ScanDFA):
+            t = time.time()
+            dfa = srgs.toDFA(dfa=cls())
+            print "%i optional items (%s): %i arcs in %.3f sec" % (n, cls.__name__, len(dfa._dfa), time.time() - t)
+    # rules referenced from many places
+    for n in (20, 80):
+        rules = '<rule id="digit"><one-of>%s</one-of><item repeat="0-3">x</item></rule>' % ("".join(['<item>d%i</item>' % (i,) for i in range(0, 100)]),)
+        rules += '<rule id="number"><ruleref uri="#digit"/><item repeat="0-1"><ruleref uri="#digit"/></item></rule>'
+        rules += '<rule id="main">%s</rule>' % ("".join(['<item>w%i</item><ruleref uri="#number"/>' % (i,) for i in range(0, n)]),)
+        srgs = SRGS(StringIO('<grammar xmlns="http://www.w3.org/2001/06/grammar" xml:lang="en" version="1.0" root="main">%s</grammar>' % (rules,)))
+        for cls in (DFA, _ExpandDFA):
+            t = time.time()
+            dfa = srgs.toDFA(dfa=cls())
+            print "%i references (%s): %i arcs in %.3f sec" % (n, cls.__name__, len(dfa._dfa), time.time() - t)
+        t = time.time()
+        (arcs, cats) = minimizedfa.categories(minimizedfa.optimize(dfa.reverse()))
+        print "%i references: %i states, %i arcs and %i categories after the minimization (%.3f sec)" % ((n,) + minimizedfa.stats(arcs) + (len(cats), time.time() - t))
+    # digit strings: an unbounded repeat formerly had to be written with
+    # a large maximum to be unrolled (best of 5 runs)
+    digits = '<one-of>%s</one-of>' % ("".join(['<item>d%i</item>' % (i,) for i in range(0, 10)]),)
+    for (repeat, cls) in (("0-20", SRGS), ("0-20", _UnrollSRGS), ("0-100", SRGS), ("0-100", _UnrollSRGS),
+                          ("1-", SRGS), ("1-100", _UnrollSRGS)):
+        t1 = None
+        for i in range(0, 5):
+            srgs = cls(StringIO('<grammar xmlns="http://www.w3.org/2001/06/grammar" xml:lang="en" version="1.0" root="main"><rule id="main"><item>number</item><item repeat="%s"><ruleref uri="#digit"/><item repeat="0-1">point</item></item></rule><rule id="digit">%s</rule></grammar>' % (repeat, digits)))
+            t = time.time()
+            dfa = srgs.toDFA()
+            if t1 is None or time.time() - t < t1:
+                t1 = time.time() - t
+        t = time.time()
+        (arcs, cats) = minimizedfa.categories(minimizedfa.optimize(dfa.reverse()))
+        print "repeat %s (%s): %i arcs in %.3f sec, %i states and %i arcs after the minimization (%.3f sec)" % \
+            ((repeat, cls.__name__, len(dfa._dfa), t1) + minimizedfa.stats(arcs) + (time.time() - t,))
+
+def _equivalence(files):
+    # the minimization must not change the accepted sentences: checked
+    # exactly and by listing the short sentences of both automata
+    ok = True
+    for f in files:
+        srgs = SRGS(f)
+        for r in sorted(srgs._rules.keys()):
+            revdfa = srgs.toDFA(r).reverse()
+            opt = minimizedfa.expand(*minimizedfa.categories(minimizedfa.optimize(revdfa)))
+            if len([v for v in opt if v[1] == minimizedfa.FINAL]) == 0:
+                # nothing to give to julius: must be refused by toJulius
+                try:
+                    srgs.toJulius(r)
+                    rejected = False
+                except KeyError, e:
+                    rejected = str(e).find("accepts no sentence") >= 0
+                print "%s#%s: accepts no sentence (%s)" % (f, r, rejected and "refused" or "NOT REFUSED")
+                ok = ok and rejected
+                continue
+            same = minimizedfa.equivalent(revdfa, opt) and \
+                minimizedfa.sentences(revdfa, 8) == minimizedfa.sentences(opt, 8)
+            print "%s#%s: %s (%i states, %i arcs -> %i states, %i arcs)" % \
+                ((f, r, same and "same" or "DIFFERENT") + minimizedfa.stats(revdfa) + minimizedfa.stats(opt))
+            ok = ok and same
+    return ok
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(not _equivalence(sys.argv[1:]))
     _test()
+    _benchmark()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Streaming audio format conversion
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FORMATS = ('int16', 'int32', 'float32')
+
+def gcd(a, b):
+    while b:
+        (a, b) = (b, a % b)
+    return a
+
+class StreamResampler:
+    """ Convert packets of any rate, channel count and sample format to
+    16bit mono packets at the given rate.
+
+    Channels are averaged and the rate is converted by a polyphase FIR
+    filter (windowed sinc) which keeps its history between packets, so that
+    the packets can be split anywhere (even inside a sample).
+
+    >>> r = StreamResampler(48000, 16000, channels=2)
+    >>> t = numpy.arange(48000) / 48000.0
+    >>> x = (numpy.sin(2 * numpy.pi * 1000 * t) * 10000).astype(numpy.int16)
+    >>> stereo = numpy.repeat(x, 2).tostring()
+    >>> out = ''.join([r.process(stereo[i:i+1001]) for i in range(0, len(stereo), 1001)])
+    >>> len(out) / 2 > 16000 - r.delay() - 2
+    True
+    >>> y = numpy.frombuffer(out, numpy.int16)
+    >>> 9800 < numpy.abs(y[1000:]).max() < 10200
+    True
+    """
+
+    def __init__(self, inrate, outrate=16000, channels=1, format='int16', zerocross=16):
+        if format not in FORMATS:
+            raise ValueError("unknown sample format: %s" % (format,))
+        g = gcd(inrate, outrate)
+        self._up = outrate / g
+        self._down = inrate / g
+        self._channels = channels
+        self._dtype = numpy.dtype(format)
+        self._scale = {'int16': 1.0, 'int32': 1.0 / 65536, 'float32': 32768.0}[format]
+        self._framebytes = self._dtype.itemsize * channels
+        self._remain = ''
+        self._passthrough = (self._up == self._down)
+        if self._passthrough:
+            return
+        # prototype lowpass filter at the upsampled rate
+        (L, M) = (self._up, self._down)
+        taps = int(numpy.ceil(2.0 * zerocross * max(L, M) / L))
+        n = numpy.arange(taps * L) - (taps * L - 1) / 2.0
+        cutoff = 0.5 / max(L, M) * 0.95
+        h = 2 * cutoff * numpy.sinc(2 * cutoff * n) * numpy.blackman(taps * L) * L
+        # phases[p, k] is the coefficient of input x[i - k] for output phase p
+        self._phases = h.reshape(taps, L).T.astype(numpy.float32)
+        self._taps = taps
+        self._hist = numpy.zeros(taps - 1, numpy.float32)
+        self._u = (taps - 1) * L # upsampled position of the next output in the buffer
+
+    def delay(self):
+        # group delay of the filter in output samples
+        if self._passthrough:
+            return 0
+        return int(self._taps * self._up / 2 / self._down)
+
+    def tomono(self, data):
+        data = self._remain + data
+        n = len(data) / self._framebytes
+        self._remain = data[n * self._framebytes:]
+        x = numpy.frombuffer(data, self._dtype, n * self._channels)
+        if self._channels > 1:
+            x = x.reshape(n, self._channels).mean(axis=1)
+        return x.astype(numpy.float32) * self._scale
+
+    def process(self, data):
+        if self._passthrough and self._channels == 1 and self._dtype == numpy.int16:
+            return data
+        x = self.tomono(data)
+        if not self._passthrough:
+            x = self.resample(x)
+        return numpy.clip(x, -32768, 32767).astype(numpy.int16).tostring()
+
+    def resample(self, x):
+        (L, M, K) = (self._up, self._down, self._taps)
+        buf = numpy.concatenate((self._hist, x))
+        # every output whose newest input sample is available
+        count = (len(buf) * L - self._u + M - 1) / M
+        if count <= 0:
+            self._hist = buf
+            return numpy.zeros(0, numpy.float32)
+        u = self._u + M * numpy.arange(count)
+        i = u / L
+        idx = i[:, numpy.newaxis] - numpy.arange(K)[numpy.newaxis, :]
+        y = (buf[idx] * self._phases[u % L]).sum(axis=1)
+        # keep the history needed by the next output
+        u = self._u + M * count
+        drop = u / L - (K - 1)
+        self._hist = buf[drop:]
+        self._u = u - drop * L
+        return y
+
+def _benchmark():
+    import time
+    sec = 10
+    for (rate, channels, format) in ((48000, 2, 'int16'), (44100, 1, 'int16'), (48000, 4, 'float32')):
+        r = StreamResampler(rate, 16000, channels, format)
+        t = numpy.arange(rate * sec) / float(rate)
+        x = numpy.repeat(numpy.sin(2 * numpy.pi * 440 * t) * 0.3, channels)
+        if format == 'int16':
+            x = x * 32767
+        data = x.astype(format).tostring()
+        packet = rate * channels * numpy.dtype(format).itemsize / 10 # 100ms
+        start = time.time()
+        size = 0
+        for i in range(0, len(data), packet):
+            size += len(r.process(data[i:i+packet]))
+        dt = time.time() - start
+        print "%i Hz %i ch %s -> 16000 Hz mono: %.1f sec in %.3f sec (%.0fx real time, %i samples)" % (rate, channels, format, sec, dt, sec / dt, size / 2)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+    _benchmark()
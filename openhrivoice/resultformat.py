@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Serialization of recognition results
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import json
+
+FORMATS = ('xml', 'json')
+
+class Result:
+    """ One hypothesis of the N-best list with its words and mean confidence.
+
+    The sentence markers (<s>, </s>) are left out unless markers is True.
+    """
+
+    def __init__(self, hypo, markers=False):
+        self._rank = hypo._rank
+        self._likelihood = hypo._score
+        self._words = [] # (text, confidence)
+        score = 0
+        for w in hypo._words:
+            if w._word == "":
+                continue
+            if markers == False and w._word[0] == '<':
+                continue
+            self._words.append((w._word, w._cm))
+            score += float(w._cm)
+        if len(self._words) > 0:
+            score = score / len(self._words)
+        self._score = score
+        self._text = " ".join([t for (t, cm) in self._words])
+
+def results(hypos, markers=False):
+    return [Result(h, markers) for h in hypos]
+
+def _escape(s):
+    # same as xml.dom.minidom
+    return s.replace(u"&", u"&amp;").replace(u"<", u"&lt;").replace(u"\"", u"&quot;").replace(u">", u"&gt;")
+
+def toxml(results):
+    """ Build the listenText document (same bytes as xml.dom.minidom gives).
+
+    >>> from openhrivoice.parsejuliusmodule import JuliusModuleParser
+    >>> p = JuliusModuleParser('utf-8')
+    >>> p.feed('<RECOGOUT>\\n<SHYPO RANK="1" SCORE="-10.5">\\n<WHYPO WORD="<s>" CM="1.0"/>\\n<WHYPO WORD="a&b" CM="0.5"/>\\n</SHYPO>\\n</RECOGOUT>\\n.\\n')
+    >>> toxml(results(p.events()[0]._hypos))
+    '<?xml version="1.0" encoding="utf-8"?><listenText><data likelihood="-10.5" rank="1" score="0.5" text="a&amp;b"><word score="0.5" text="a&amp;b"/></data></listenText>'
+    """
+    if len(results) == 0:
+        return '<?xml version="1.0" encoding="utf-8"?><listenText/>'
+    out = [u'<?xml version="1.0" encoding="utf-8"?><listenText>']
+    for r in results:
+        # attributes are sorted by name as minidom does
+        out.append(u'<data likelihood="%s" rank="%s" score="%s" text="%s"' %
+                   (_escape(r._likelihood), _escape(r._rank), str(r._score), _escape(r._text)))
+        if len(r._words) == 0:
+            out.append(u'/>')
+            continue
+        out.append(u'>')
+        for (text, cm) in r._words:
+            out.append(u'<word score="%s" text="%s"/>' % (_escape(cm), _escape(text)))
+        out.append(u'</data>')
+    out.append(u'</listenText>')
+    return u''.join(out).encode('utf-8')
+
+def tojson(results):
+    """ Build a compact N-best document.
+
+    >>> from openhrivoice.parsejuliusmodule import JuliusModuleParser
+    >>> p = JuliusModuleParser('utf-8')
+    >>> p.feed('<RECOGOUT>\\n<SHYPO RANK="1" SCORE="-10.5">\\n<WHYPO WORD="hello" CM="0.5"/>\\n</SHYPO>\\n</RECOGOUT>\\n.\\n')
+    >>> tojson(results(p.events()[0]._hypos))
+    '{"nbest":[{"likelihood":-10.5,"rank":1,"score":0.5,"text":"hello","words":[{"score":0.5,"text":"hello"}]}]}'
+    """
+    nbest = []
+    for r in results:
+        nbest.append({'rank': _number(r._rank, int), 'likelihood': _number(r._likelihood, float),
+                      'score': r._score, 'text': r._text,
+                      'words': [{'text': t, 'score': _number(cm, float)} for (t, cm) in r._words]})
+    # the ascii output is done by the C encoder of json
+    return json.dumps({'nbest': nbest}, sort_keys=True, separators=(',', ':'))
+
+def _number(s, type):
+    try:
+        return type(s)
+    except (TypeError, ValueError):
+        return s
+
+def _minidom(results):
+    # reference implementation (the format used to be built with minidom)
+    from xml.dom.minidom import Document
+    doc = Document()
+    listentext = doc.createElement("listenText")
+    doc.appendChild(listentext)
+    for r in results:
+        hypo = doc.createElement("data")
+        for (text, cm) in r._words:
+            whypo = doc.createElement("word")
+            whypo.setAttribute("text", text)
+            whypo.setAttribute("score", cm)
+            hypo.appendChild(whypo)
+        hypo.setAttribute("rank", r._rank)
+        hypo.setAttribute("score", str(r._score))
+        hypo.setAttribute("likelihood", r._likelihood)
+        hypo.setAttribute("text", r._text)
+        listentext.appendChild(hypo)
+    return doc.toxml(encoding="utf-8")
+
+def _benchmark():
+    import time
+    from openhrivoice.parsejuliusmodule import JuliusModuleParser
+    words = [u'<s>', u'りんご', u'を', u'a&b>c', u'ください', u'</s>']
+    msg = u'<RECOGOUT>\n'
+    for r in range(1, 6):
+        msg += u'  <SHYPO RANK="%i" SCORE="-%i.25" GRAM="0">\n' % (r, r * 1000)
+        for w in words:
+            msg += u'    <WHYPO WORD="%s" CLASSID="0" PHONE="a i u" CM="0.%i"/>\n' % (w, 9 - r)
+        msg += u'  </SHYPO>\n'
+    msg += u'</RECOGOUT>\n.\n'
+    p = JuliusModuleParser('utf-8')
+    p.feed(msg.encode('utf-8'))
+    hypos = p.events()[0]._hypos
+    assert toxml(results(hypos)) == _minidom(results(hypos))
+    assert toxml(results(hypos[0:0])) == _minidom(results(hypos[0:0]))
+    n = 2000
+    for (name, func) in (('minidom', _minidom), ('toxml', toxml), ('tojson', tojson)):
+        t = time.time()
+        for i in range(0, n):
+            func(results(hypos))
+        dt = time.time() - t
+        print "%s: %.1f usec/result (5-best, %i bytes)" % (name, dt * 1e6 / n, len(func(results(hypos))))
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
+    _benchmark()
@@ -51,6 +51,9 @@ def main():
     parser.add_option('-r', '--target-rule', dest='targetrule', action="store",
                       type="string",
                       help=_('specify target rule id'))
+    parser.add_option('-n', '--no-minimize', dest='minimize', action="store_false",
+                      default=True,
+                      help=_('output the automaton without determinization and minimization'))
     try:
         opts, args = parser.parse_args()
     except optparse.OptionError, e:
@@ -63,7 +66,10 @@ def main():
 
     srgs = SRGS(args[0])
 
-    print srgs.toJulius(opts.targetrule)
+    print srgs.toJulius(opts.targetrule, opts.minimize)
+    if opts.verbose:
+        for (r, (before, after)) in srgs._stats.items():
+            print >>sys.stderr, "%s: %i states, %i arcs (%i states, %i arcs before the minimization)" % (r, after[0], after[1], before[0], before[1])
 
 if __name__ == '__main__':
     main()
@@ -181,3 +181,14 @@ def genmanagerargs(opt):
     if opt.mastermode == True:
         args.append('-d')
 
+
+def initialparameter(properties, name, default):
+    # value of a configuration parameter in onInitialize (the bound
+    # variables are updated only after it returns)
+    active = properties.getProperty("configuration.active_config", "default")
+    value = properties.getProperty("conf.%s.%s" % (active, name), "")
+    if value == "":
+        value = properties.getProperty("conf.default.%s" % (name,), "")
+    if value == "":
+        return default
+    return value
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''In-memory capture of recognized utterances
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+import threading
+from collections import deque
+
+class UtteranceCapture:
+    """ Keep the latest audio sent to the recognizer and cut utterances out of it.
+
+    Positions are counted in bytes of audio sent. STARTREC and ENDREC mark
+    the boundaries as seen from this side of the socket, and the segment
+    length reported by Julius (<INPUTPARAM MSEC="..."/>) is used to place the
+    start of the utterance exactly when it is available.
+    """
+
+    def __init__(self, rate=16000, width=2, maxsec=30.0, headmargin=0.3):
+        self._bytespersec = rate * width
+        self._width = width
+        self._maxbytes = int(maxsec * self._bytespersec)
+        self._headmargin = self.tobytes(headmargin)
+        self._chunks = deque() # (position, time, data)
+        self._pos = 0
+        self._size = 0
+        self._start = None
+        self._end = None
+        self._lock = threading.Lock()
+
+    def tobytes(self, sec):
+        return int(sec * self._bytespersec) / self._width * self._width
+
+    def append(self, data, t):
+        self._lock.acquire()
+        try:
+            self._chunks.append((self._pos, t, data))
+            self._pos += len(data)
+            self._size += len(data)
+            while self._size - len(self._chunks[0][2]) >= self._maxbytes:
+                (p, t0, d) = self._chunks.popleft()
+                self._size -= len(d)
+        finally:
+            self._lock.release()
+
+    def startrec(self):
+        self._start = max(self._pos - self._headmargin, 0)
+        self._end = None
+
+    def endrec(self):
+        if self._start is not None:
+            self._end = self._pos
+
+    def cut(self, msec=None):
+        # return (time of the first sample, data) of the last utterance or None
+        if self._start is None or self._end is None:
+            return None
+        start = self._start
+        end = self._end
+        if msec is not None:
+            start = max(end - self.tobytes(msec / 1000.0), 0)
+        self._start = None
+        self._end = None
+        ret = []
+        t = None
+        self._lock.acquire()
+        try:
+            for (p, t0, d) in self._chunks:
+                if p + len(d) <= start or p >= end:
+                    continue
+                s = max(start - p, 0)
+                e = min(end - p, len(d))
+                if t is None:
+                    t = t0 + float(s) / self._bytespersec
+                ret.append(d[s:e])
+        finally:
+            self._lock.release()
+        if t is None:
+            return None
+        return (t, "".join(ret))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Voice activity detection
+
+Copyright (C) 2010
+    Yosuke Matsusaka
+    Intelligent Systems Research Institute,
+    National Institute of Advanced Industrial Science and Technology (AIST),
+    Japan
+    All rights reserved.
+Licensed under the Eclipse Public License -v 1.0 (EPL)
+http://www.opensource.org/licenses/eclipse-1.0.txt
+'''
+
+from collections import deque
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class VoiceActivityDetector:
+    """ Energy and zero-crossing voice activity gate for 16bit mono audio.
+
+    process() returns only the audio of the speech regions: pre-roll frames
+    before the onset, the frames of speech, hangover frames after it and
+    some silence to let the recognizer close the segment. The audio comes
+    as a list of (data, time of its first sample) chunks, a new chunk
+    starting at each onset. Frames are classified with NumPy, so idle
+    input costs a couple of vector operations per packet.
+
+    >>> vad = VoiceActivityDetector(rate=1000, frame=0.01, preroll=0.02, hangover=0.02, tail=0.0)
+    >>> silence = '\\0\\0' * 100
+    >>> speech = numpy.tile(numpy.array([10000, -10000], numpy.int16), 50).tostring()
+    >>> vad.process(silence, 0.0)
+    ([], [])
+    >>> (chunks, events) = vad.process(speech, 0.1)
+    >>> ([(len(d), t) for (d, t) in chunks], events)
+    ([(240, 0.08)], ['STARTREC'])
+    >>> (chunks, events) = vad.process(silence, 0.2)
+    >>> ([(len(d), t) for (d, t) in chunks], events)
+    ([(40, 0.2)], ['LISTEN'])
+
+    A segment ending and another starting within one packet gives two
+    chunks, the second one timed from its own pre-roll:
+
+    >>> (chunks, events) = vad.process(speech[:60] + silence[:100] + speech[:60], 0.3)
+    >>> ([(len(d), round(t, 3)) for (d, t) in chunks], events)
+    ([(140, 0.28), (100, 0.36)], ['STARTREC', 'LISTEN', 'STARTREC'])
+    """
+
+    def __init__(self, rate=16000, level=-40.0, zerocross=60, hangover=0.5, preroll=0.3, frame=0.01, tail=0.5):
+        self._rate = rate
+        self._frame = frame
+        self._framelen = int(rate * frame)
+        self._framebytes = self._framelen * 2
+        self._level = 32768.0 * pow(10.0, level / 20.0) # rms
+        self._zerocross = zerocross * frame # per frame
+        self._hangover = int(hangover / frame)
+        self._tail = '\0\0' * int(rate * tail)
+        self._preroll = deque(maxlen=int(preroll / frame))
+        self._remain = ''
+        self._remaintime = None
+        self._speech = False
+        self._silent = 0
+
+    def process(self, data, t):
+        # returns ([(audio to be forwarded, time of its first sample), ...], status transitions)
+        buf = self._remain + data
+        if self._remaintime is not None:
+            t = self._remaintime
+        n = len(buf) / self._framebytes
+        self._remain = buf[n * self._framebytes:]
+        self._remaintime = t + float(n * self._framelen) / self._rate
+        if len(self._remain) == 0:
+            self._remaintime = None
+        if n == 0:
+            return ([], [])
+        x = numpy.frombuffer(buf, numpy.int16, n * self._framelen).reshape(n, self._framelen).astype(numpy.float32)
+        rms = numpy.sqrt((x * x).mean(axis=1))
+        zc = (numpy.diff(numpy.signbit(x), axis=1) != 0).sum(axis=1)
+        voiced = (rms > self._level) & (zc >= self._zerocross)
+        if not self._speech and not voiced.any():
+            # idle: only keep the pre-roll
+            for i in range(max(n - self._preroll.maxlen, 0), n):
+                self._preroll.append((t + i * self._frame, buf[i * self._framebytes:(i + 1) * self._framebytes]))
+            return ([], [])
+        chunks = []
+        out = []
+        outtime = None
+        events = []
+        for i in range(0, n):
+            ft = t + i * self._frame
+            frame = buf[i * self._framebytes:(i + 1) * self._framebytes]
+            if self._speech:
+                if voiced[i]:
+                    self._silent = 0
+                else:
+                    self._silent += 1
+                if outtime is None:
+                    outtime = ft
+                out.append(frame)
+                if self._silent >= self._hangover:
+                    self._speech = False
+                    out.append(self._tail)
+                    events.append('LISTEN')
+            elif voiced[i]:
+                self._speech = True
+                self._silent = 0
+                events.append('STARTREC')
+                if len(out) > 0:
+                    # the previous segment ended in this packet
+                    chunks.append(("".join(out), outtime))
+                    out = []
+                if len(self._preroll) > 0:
+                    outtime = self._preroll[0][0]
+                else:
+                    outtime = ft
+                out.extend([f for (pt, f) in self._preroll])
+                self._preroll.clear()
+                out.append(frame)
+            else:
+                self._preroll.append((ft, frame))
+        if len(out) > 0:
+            chunks.append(("".join(out), outtime))
+        return (chunks, events)
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == "__main__":
+    _test()
@@ -86,6 +86,9 @@ setup(name='openhrivoice',
       bundlexinclude = openhrivoice.bundlexinclude:main
       plstosinglewordgrammar = openhrivoice.plstosinglewordgrammar:main
       juliustographviz = openhrivoice.juliustographviz:main
+      juliusstub = openhrivoice.juliusstub:main
+      juliusreplay = openhrivoice.juliusreplay:main
+      juliussweep = openhrivoice.juliussweep:main
       maryrtc = openhrivoice.MARYRTC:main
       festivalrtc = openhrivoice.FestivalRTC:main
       combineresultsrtc = openhrivoice.CombineResultsRTC:main